@@ -0,0 +1,232 @@
+#! /usr/bin/env python3
+# encoding: utf-8
+'''
+ -- Maintains the ancestry closure table of the sample hierarchy
+
+
+@deffield    updated: Updated
+'''
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+import psycopg2
+import psycopg2.extras
+import getpass
+import sys
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+
+# Deepest hierarchy written by rebuild, also stops parent cycles
+MAX_DEPTH = 100
+
+# One row for every ancestor of every entry, including the entry itself at
+# depth 0. Top entries are the ancestors without a parent.
+create_str = '''
+CREATE TABLE IF NOT EXISTS aen_closure (ancestor uuid NOT NULL,
+                                        descendant uuid NOT NULL,
+                                        depth integer NOT NULL,
+                                        PRIMARY KEY (ancestor, descendant));
+CREATE INDEX IF NOT EXISTS aen_closure_descendant_idx ON aen_closure (descendant, depth);
+-- The insert trigger looks up the children waiting for every new row
+CREATE INDEX IF NOT EXISTS aen_parenteventid_idx ON aen (parenteventid);
+'''
+
+# The triggers run after every row, once the whole statement is written, so
+# parents and children inserted by the same statement are linked in any order
+trigger_str = '''
+CREATE OR REPLACE FUNCTION aen_closure_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO aen_closure VALUES (NEW.eventid, NEW.eventid, 0)
+    ON CONFLICT DO NOTHING;
+    -- Below the ancestors of the parent, unless the parent is in the
+    -- subtree of the children waiting for this row
+    IF NEW.parenteventid = NEW.eventid OR EXISTS (
+        SELECT 1 FROM aen c JOIN aen_closure d ON d.ancestor = c.eventid
+        WHERE c.parenteventid = NEW.eventid AND d.descendant = NEW.parenteventid) THEN
+        RAISE NOTICE 'Parent % of % is its own descendant, not linked', NEW.parenteventid, NEW.eventid;
+    ELSE
+        INSERT INTO aen_closure
+        SELECT a.ancestor, NEW.eventid, a.depth + 1
+        FROM aen_closure a WHERE a.descendant = NEW.parenteventid
+        ON CONFLICT DO NOTHING;
+    END IF;
+    -- Children already there, waiting for this parent, bring their subtrees
+    INSERT INTO aen_closure
+    SELECT a.ancestor, d.descendant, a.depth + d.depth + 1
+    FROM aen_closure a, aen c JOIN aen_closure d ON d.ancestor = c.eventid
+    WHERE a.descendant = NEW.eventid AND c.parenteventid = NEW.eventid
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION aen_closure_move() RETURNS trigger AS $$
+BEGIN
+    -- Cut the subtree loose from the old ancestors
+    DELETE FROM aen_closure
+    WHERE descendant IN (SELECT descendant FROM aen_closure WHERE ancestor = NEW.eventid)
+    AND ancestor IN (SELECT ancestor FROM aen_closure
+                     WHERE descendant = NEW.eventid AND ancestor <> NEW.eventid);
+    IF EXISTS (SELECT 1 FROM aen_closure
+               WHERE ancestor = NEW.eventid AND descendant = NEW.parenteventid) THEN
+        RAISE NOTICE 'Parent % of % is its own descendant, not linked', NEW.parenteventid, NEW.eventid;
+        RETURN NULL;
+    END IF;
+    INSERT INTO aen_closure
+    SELECT a.ancestor, d.descendant, a.depth + d.depth + 1
+    FROM aen_closure a, aen_closure d
+    WHERE a.descendant = NEW.parenteventid AND d.ancestor = NEW.eventid
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION aen_closure_delete() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM aen_closure
+    WHERE descendant IN (SELECT descendant FROM aen_closure WHERE ancestor = OLD.eventid)
+    AND ancestor IN (SELECT ancestor FROM aen_closure WHERE descendant = OLD.eventid);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS aen_closure_insert ON aen;
+CREATE TRIGGER aen_closure_insert AFTER INSERT ON aen
+    FOR EACH ROW EXECUTE PROCEDURE aen_closure_insert();
+DROP TRIGGER IF EXISTS aen_closure_move ON aen;
+CREATE TRIGGER aen_closure_move AFTER UPDATE OF parenteventid ON aen
+    FOR EACH ROW WHEN (OLD.parenteventid IS DISTINCT FROM NEW.parenteventid)
+    EXECUTE PROCEDURE aen_closure_move();
+DROP TRIGGER IF EXISTS aen_closure_delete ON aen;
+CREATE TRIGGER aen_closure_delete AFTER DELETE ON aen
+    FOR EACH ROW EXECUTE PROCEDURE aen_closure_delete();
+'''
+
+drop_str = '''
+DROP TRIGGER IF EXISTS aen_closure_insert ON aen;
+DROP TRIGGER IF EXISTS aen_closure_move ON aen;
+DROP TRIGGER IF EXISTS aen_closure_delete ON aen;
+DROP FUNCTION IF EXISTS aen_closure_insert();
+DROP FUNCTION IF EXISTS aen_closure_move();
+DROP FUNCTION IF EXISTS aen_closure_delete();
+DROP TABLE IF EXISTS aen_closure;
+'''
+
+
+def rebuild(cur):
+    """
+    Writes the closure table from scratch with one recursive query
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    Returns
+    ----------
+    rows: int
+        The number of rows in the closure table
+    """
+    cur.execute("TRUNCATE aen_closure")
+    cur.execute('''
+    INSERT INTO aen_closure (ancestor, descendant, depth)
+    WITH RECURSIVE up AS (
+        SELECT eventid AS ancestor, eventid AS descendant, parenteventid, 0 AS depth
+        FROM aen
+        UNION ALL
+        SELECT p.eventid, u.descendant, p.parenteventid, u.depth + 1
+        FROM up u JOIN aen p ON p.eventid = u.parenteventid
+        WHERE u.depth < %s
+    )
+    SELECT ancestor, descendant, min(depth) FROM up
+    GROUP BY ancestor, descendant''', (MAX_DEPTH,))
+    return cur.rowcount
+
+
+def install(cur):
+    """
+    Creates the closure table and the triggers keeping it up to date when
+    rows are inserted, deleted or get a new parent, and fills the table.
+    Also indexes aen on parenteventid, used by the insert trigger.
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    Returns
+    ----------
+    rows: int
+        The number of rows in the closure table
+    """
+    cur.execute(create_str)
+    cur.execute(trigger_str)
+    return rebuild(cur)
+
+
+def uninstall(cur):
+    """
+    Removes the triggers and the closure table
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+    """
+    cur.execute(drop_str)
+
+
+def main():
+    '''Command line options.'''
+    args = parse_options()
+    # Connect to the database as the user running the script
+    conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+    cur = conn.cursor()
+    if args.action == 'install':
+        print("Closure table installed with", install(cur), "rows")
+    elif args.action == 'rebuild':
+        print("Closure table rebuilt with", rebuild(cur), "rows")
+    else:
+        uninstall(cur)
+        print("Closure table removed")
+    conn.commit()
+    cur.close()
+    conn.close()
+    return 0
+
+
+def parse_options():
+    """
+    Parse the command line options and return these.
+    """
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (
+        program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+    Created on %s.
+
+    Distributed on an "AS IS" basis without warranties
+    or conditions of any kind, either express or implied.
+
+    USAGE
+''' % (program_shortdesc, str(__date__))
+
+    # Setup argument parser
+    parser = ArgumentParser(description=program_license,
+                            formatter_class=RawDescriptionHelpFormatter)
+
+    parser.add_argument('action', choices=['install', 'rebuild', 'uninstall'],
+                        help='''install creates the table and triggers, rebuild rewrites the table, uninstall removes both''')
+    parser.add_argument('-V', '--version', action='version',
+                        version=program_version_message)
+
+    # Process arguments
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(main())
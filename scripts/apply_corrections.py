@@ -0,0 +1,297 @@
+#! /usr/bin/env python3
+# encoding: utf-8
+'''
+ -- Applies the corrections in a rules file to the database in bulk
+
+
+@deffield    updated: Updated
+'''
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+import psycopg2
+import psycopg2.extras
+from psycopg2 import sql
+import csv
+import getpass
+import sys
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+
+# What a rule can do
+# remap: change the value old of field to new, field is a column or a key in other
+# rename-key: rename the key old in the hstore field (other or metadata) to new
+# move: move the values of the column old to the column new, where new is empty
+# append: add the text new to the text column field, after a comma
+ACTIONS = ["remap", "rename-key", "move", "append"]
+
+# Columns in the rules file, where is an optional SQL condition on the row,
+# which is aen a
+RULE_COLUMNS = ["action", "field", "old", "new", "where"]
+
+STAMP = '''to_char(now() at time zone 'utc', 'YYYY-MM-DD"T"HH24:MI:SS"Z"')'''
+
+
+def read_rules(path):
+    '''
+    Reads a rules file
+
+    Parameters
+    ----------
+    path: str
+        csv file with the columns in RULE_COLUMNS
+
+    Returns
+    ----------
+    rules: list of dicts
+    '''
+    rules = []
+    with open(path, newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            rule = {c: (row.get(c) or '') for c in RULE_COLUMNS}
+            if rule['action'] not in ACTIONS:
+                raise ValueError("Unknown action " + rule['action'] +
+                                 " on line " + str(line) + " of " + path)
+            rules.append(rule)
+    return rules
+
+
+def column_types(cur):
+    '''
+    The columns of aen and their types, as written in a cast
+    '''
+    cur.execute('''SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute
+                   WHERE attrelid = 'aen'::regclass AND attnum > 0 AND NOT attisdropped''')
+    return dict(cur.fetchall())
+
+
+def group_rules(rules):
+    '''
+    Groups the rules that can be applied in one statement, these have the
+    same action, field and condition. Every move is its own group.
+
+    Returns
+    ----------
+    groups: dict
+        (action, field, where) and the list of (old, new) pairs
+    '''
+    groups = {}
+    for rule in rules:
+        if rule['action'] == 'move':
+            field = rule['old'] + '>' + rule['new']
+        elif rule['action'] == 'rename-key':
+            field = rule['field'].lower() or 'other'
+        else:
+            field = rule['field']
+        groups.setdefault((rule['action'], field, rule['where']), []).append(
+            (rule['old'], rule['new']))
+    return groups
+
+
+def group_sql(action, field, types, condition):
+    '''
+    The UPDATE for a group and the history message of each of its rules.
+    The rules are in the table v (old, new) and the row in aen a.
+
+    Parameters
+    ----------
+    action: str
+
+    field: str
+        As in the keys of group_rules
+
+    types: dict
+        As returned by column_types
+
+    condition: psycopg2.sql.Composable
+        Condition on the rows
+
+    Returns
+    ----------
+    update: psycopg2.sql.Composable
+        Returns the eventid of every changed row with the arrays olds
+        and news of the rules changing it
+
+    message: psycopg2.sql.Composable
+        Text expression for a rule r (old, new) changing a row
+    '''
+    if action == 'remap' and field.lower() in types:
+        col = sql.Identifier(field.lower())
+        update = sql.SQL('''UPDATE aen a SET {0} = v.new::{1} FROM v
+        WHERE a.{0}::text = v.old AND ({2})''').format(
+            col, sql.SQL(types[field.lower()]), condition)
+        message = sql.SQL("'Changed ' || {} || ' from ' || r.old || ' to ' || r.new").format(
+            sql.Literal(field))
+    elif action == 'remap':  # A key in other
+        key = sql.Literal(field)
+        update = sql.SQL('''UPDATE aen a SET other = a.other || hstore({0}, v.new) FROM v
+        WHERE a.other -> {0} = v.old AND ({1})''').format(key, condition)
+        message = sql.SQL("'Changed ' || {} || ' from ' || r.old || ' to ' || r.new").format(key)
+    elif action == 'rename-key':
+        if field not in ('other', 'metadata'):
+            raise ValueError("Keys can only be renamed in other or metadata, not " + field)
+        h = sql.Identifier(field)
+        # All the keys of a row are renamed at once, whichever rules matched
+        return sql.SQL('''UPDATE aen a SET {0} = (
+            SELECT hstore(array_agg(coalesce(r.new, e.key)), array_agg(e.value))
+            FROM each(a.{0}) e LEFT JOIN v r ON r.old = e.key)
+        FROM (SELECT a.eventid, array_agg(v.old) AS olds, array_agg(v.new) AS news
+              FROM aen a JOIN v ON a.{0} ? v.old WHERE ({1}) GROUP BY a.eventid) m
+        WHERE a.eventid = m.eventid
+        RETURNING a.eventid, m.olds, m.news''').format(h, condition), sql.SQL(
+            "'Renamed key ' || r.old || ' to ' || r.new || ' in ' || {}").format(
+                sql.Literal(field))
+    elif action == 'append':
+        if field.lower() not in types:
+            raise ValueError("Can only append to columns, not " + field)
+        col = sql.Identifier(field.lower())
+        # All the texts of the group are added at once
+        return sql.SQL('''UPDATE aen a SET {0} = concat_ws(', ', a.{0},
+            (SELECT string_agg(v.new, ', ') FROM v))
+        WHERE ({1})
+        RETURNING a.eventid, (SELECT array_agg(v.old) FROM v),
+                  (SELECT array_agg(v.new) FROM v)''').format(col, condition), sql.SQL(
+            "'Added ' || r.new || ' to ' || {}").format(sql.Literal(field))
+    else:
+        old, new = field.split('>')
+        if old.lower() not in types or new.lower() not in types:
+            raise ValueError("Can only move between columns, not " + old + " to " + new)
+        source = sql.Identifier(old.lower())
+        target = sql.Identifier(new.lower())
+        update = sql.SQL('''UPDATE aen a SET {1} = a.{0}::{2}, {0} = NULL FROM v
+        WHERE a.{0} IS NOT NULL AND a.{1} IS NULL AND ({3})''').format(
+            source, target, sql.SQL(types[new.lower()]), condition)
+        message = sql.SQL("'Moved ' || r.old || ' to ' || r.new")
+    update = sql.SQL("{} RETURNING a.eventid, ARRAY[v.old], ARRAY[v.new]").format(update)
+    return update, message
+
+
+def apply_rules(cur, rules, dry_run=False, reason=''):
+    '''
+    Applies the rules with one statement for each group of rules,
+    joined against the rules as a VALUES table. The changes are logged,
+    and every changed row then gets modified set and a single history line
+    with all the rules changing it.
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    rules: list of dicts
+        As returned by read_rules
+
+    dry_run: bool, optional
+        Only count the rows every rule would change, the changes are
+        rolled back
+        Default: False
+
+    reason: str, optional
+        Appended to the history lines
+        Default: ''
+
+    Returns
+    ----------
+    results: list of dicts
+        The rules with the number of rows changed
+    '''
+    types = column_types(cur)
+    cur.execute("SAVEPOINT apply_rules")
+    cur.execute('''CREATE TEMP TABLE correction_log
+                   (grp integer, eventid uuid, old text, new text, message text)''')
+    groups = list(group_rules(rules).items())
+    for grp, ((action, field, where), pairs) in enumerate(groups):
+        update, message = group_sql(action, field, types,
+                                    sql.SQL(where if where else "true"))
+        cur.execute(sql.SQL('''WITH v (old, new) AS (VALUES {values}),
+        done (eventid, olds, news) AS ({update})
+        INSERT INTO correction_log
+        SELECT {grp}, d.eventid, r.old, r.new, {message}
+        FROM done d, unnest(d.olds, d.news) r (old, new)''').format(
+            values=sql.SQL(', ').join([sql.SQL("({}, {})").format(sql.Literal(o), sql.Literal(n))
+                                       for o, n in pairs]),
+            update=update, grp=sql.Literal(grp), message=message))
+    cur.execute("SELECT grp, old, new, count(*) FROM correction_log GROUP BY grp, old, new")
+    counts = {(r[0], r[1], r[2]): r[3] for r in cur.fetchall()}
+    results = []
+    for grp, ((action, field, where), pairs) in enumerate(groups):
+        for old, new in pairs:
+            results.append({'action': action, 'field': field.split('>')[0] if action != 'move' else '',
+                            'old': old, 'new': new, 'where': where,
+                            'rows': counts.get((grp, old, new), 0)})
+    if dry_run:
+        cur.execute("ROLLBACK TO SAVEPOINT apply_rules")
+        return results
+    cur.execute(sql.SQL('''UPDATE aen a SET modified = now(),
+        history = concat_ws(E'\\n', a.history, {stamp} || ': ' || l.message || {reason})
+    FROM (SELECT eventid, string_agg(message, '; ' ORDER BY grp, old) AS message
+          FROM correction_log GROUP BY eventid) l
+    WHERE a.eventid = l.eventid''').format(
+        stamp=sql.SQL(STAMP), reason=sql.Literal('. ' + reason if reason else '')))
+    cur.execute("DROP TABLE correction_log")
+    cur.execute("RELEASE SAVEPOINT apply_rules")
+    return results
+
+
+def main():
+    '''Command line options.'''
+    args = parse_options()
+    rules = read_rules(args.rules)
+    # Connect to the database as the user running the script
+    conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+    cur = conn.cursor()
+    results = apply_rules(cur, rules, args.dry_run, args.reason)
+    for r in results:
+        print(r['action'], r['field'], r['old'], '->', r['new'],
+              ('where ' + r['where']) if r['where'] else '', ':', r['rows'], 'rows')
+    if args.dry_run:
+        print("Dry run, nothing changed")
+        conn.rollback()
+    else:
+        conn.commit()
+    cur.close()
+    conn.close()
+    return 0
+
+
+def parse_options():
+    """
+    Parse the command line options and return these.
+    """
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (
+        program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+    Created on %s.
+
+    Distributed on an "AS IS" basis without warranties
+    or conditions of any kind, either express or implied.
+
+    USAGE
+''' % (program_shortdesc, str(__date__))
+
+    # Setup argument parser
+    parser = ArgumentParser(description=program_license,
+                            formatter_class=RawDescriptionHelpFormatter)
+
+    parser.add_argument('rules', type=str,
+                        help="csv file with the columns " + ", ".join(RULE_COLUMNS))
+    parser.add_argument('-V', '--version', action='version',
+                        version=program_version_message)
+    parser.add_argument('-n', '--dry-run', dest='dry_run', default=False, action="store_true",
+                        help="Only count the rows every rule would change, [default: %(default)s]")
+    parser.add_argument('-r', '--reason', dest='reason', default='', type=str,
+                        help="Reason appended to the history lines")
+
+    # Process arguments
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#! /usr/bin/env python3
+# encoding: utf-8
+'''
+ -- Audits the integrity of the sample hierarchy in one pass over the catalogue
+
+
+@deffield    updated: Updated
+'''
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+import psycopg2
+import psycopg2.extras
+import getpass
+import sys
+import pandas as pd
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+
+COLUMNS = ["problem", "eventid", "parenteventid",
+           "cruisenumber", "sampletype", "source", "detail"]
+
+# Every row of the catalogue next to its parent, read once and shared by
+# the checks. Rows reached from a top entry, or from a child of a missing
+# parent, get their depth, the rest are in or below a parent cycle.
+BASE = '''
+WITH RECURSIVE pairs AS (
+    SELECT c.eventid, c.parenteventid, c.cruisenumber, c.sampletype, c.source,
+           p.eventid IS NOT NULL AS has_parent,
+           -- least would turn the NULL of a missing parent or position into 1
+           CASE WHEN d.h IS NOT NULL THEN 2 * 6371 * asin(least(1, d.h)) END AS km,
+           abs(c.eventdate - p.eventdate) AS days
+    FROM aen c LEFT JOIN aen p ON p.eventid = c.parenteventid
+    CROSS JOIN LATERAL (SELECT sqrt(
+               sin(radians(c.decimallatitude - p.decimallatitude) / 2) ^ 2 +
+               cos(radians(c.decimallatitude)) * cos(radians(p.decimallatitude)) *
+               sin(radians(c.decimallongitude - p.decimallongitude) / 2) ^ 2) AS h) d
+),
+tree AS (
+    SELECT eventid, 0 AS depth FROM pairs
+    WHERE parenteventid IS NULL OR NOT has_parent
+    UNION ALL
+    SELECT c.eventid, t.depth + 1
+    FROM tree t JOIN aen c ON c.parenteventid = t.eventid
+)
+'''
+
+# The checks, each giving rows with the columns in COLUMNS
+CHECKS = {
+    "orphan": '''
+    SELECT DISTINCT ON (parenteventid) 'orphan', eventid, parenteventid,
+           cruisenumber, sampletype, source,
+           'Parent missing, ' || count(*) OVER (PARTITION BY parenteventid) || ' children'
+    FROM pairs WHERE parenteventid IS NOT NULL AND NOT has_parent
+    ORDER BY parenteventid, eventid''',
+    "self-parent": '''
+    SELECT 'self-parent', eventid, parenteventid, cruisenumber, sampletype,
+           source, 'Parent is the row itself'
+    FROM pairs WHERE eventid = parenteventid''',
+    "cycle": '''
+    SELECT 'cycle', eventid, parenteventid, cruisenumber, sampletype, source,
+           'In or below a parent cycle'
+    FROM pairs p WHERE eventid <> parenteventid
+    AND NOT EXISTS (SELECT 1 FROM tree t WHERE t.eventid = p.eventid)''',
+    "depth": '''
+    SELECT 'depth', p.eventid, parenteventid, cruisenumber, sampletype, source,
+           'Depth ' || t.depth
+    FROM tree t JOIN pairs p ON p.eventid = t.eventid
+    WHERE t.depth > %(max_depth)s''',
+    "position": '''
+    SELECT 'position', eventid, parenteventid, cruisenumber, sampletype, source,
+           round(km::numeric, 1) || ' km from parent'
+    FROM pairs WHERE km > %(max_km)s''',
+    "date": '''
+    SELECT 'date', eventid, parenteventid, cruisenumber, sampletype, source,
+           days || ' days from parent'
+    FROM pairs WHERE days > %(max_days)s''',
+}
+
+
+def audit(cur, checks=None, max_depth=5, max_km=10, max_days=2):
+    """
+    Runs the checks in one query over the catalogue
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    checks: list of str, optional
+        Keys in CHECKS, all if None
+
+    max_depth: int, optional
+        Deepest allowed level below the top entry
+        Default: 5
+
+    max_km: float, optional
+        Largest allowed distance between a child and its parent
+        Default: 10
+
+    max_days: int, optional
+        Largest allowed number of days between a child and its parent
+        Default: 2
+
+    Returns
+    ----------
+    problems: pandas.DataFrame
+        One row per problem with the columns in COLUMNS
+    """
+    if checks is None:
+        checks = list(CHECKS)
+    query = (BASE + 'SELECT * FROM (' + '\nUNION ALL\n'.join(
+        ['(' + CHECKS[c] + ')' for c in checks]) + ') AS problems\nORDER BY 1, 4, 3, 2')
+    cur.execute(query, {'max_depth': max_depth,
+                        'max_km': max_km,
+                        'max_days': max_days})
+    return pd.DataFrame([[str(v) if v is not None else '' for v in r]
+                         for r in cur.fetchall()], columns=COLUMNS)
+
+
+def write_problems(problems, path):
+    """
+    Writes the problems as csv, or json if path ends with .json
+
+    Parameters
+    ----------
+    problems: pandas.DataFrame
+        From audit
+
+    path: str
+        The output file
+    """
+    if path.lower().endswith('.json'):
+        problems.to_json(path, orient='records', indent=2)
+    else:
+        problems.to_csv(path, index=False)
+
+
+def main():
+    '''Command line options.'''
+    args = parse_options()
+    # Connect to the database as the user running the script
+    conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+    cur = conn.cursor()
+    problems = audit(cur, args.checks, args.max_depth,
+                     args.max_km, args.max_days)
+    cur.close()
+    conn.close()
+    if args.output:
+        write_problems(problems, args.output)
+        print("Problems written to", args.output)
+    elif not problems.empty:
+        print(problems.to_string(index=False))
+    counts = problems['problem'].value_counts()
+    for check in args.checks or CHECKS:
+        print(check + ':', counts.get(check, 0))
+    # Non zero exit status makes the audit usable as a gate before export
+    return 1 if not problems.empty else 0
+
+
+def parse_options():
+    """
+    Parse the command line options and return these.
+    """
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (
+        program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+    Created on %s.
+
+    Distributed on an "AS IS" basis without warranties
+    or conditions of any kind, either express or implied.
+
+    USAGE
+''' % (program_shortdesc, str(__date__))
+
+    # Setup argument parser
+    parser = ArgumentParser(description=program_license,
+                            formatter_class=RawDescriptionHelpFormatter)
+
+    parser.add_argument('-V', '--version', action='version',
+                        version=program_version_message)
+    parser.add_argument('-c', '--checks', dest='checks', default=None, nargs='+', choices=list(CHECKS),
+                        help="Checks to run, [default: all]")
+    parser.add_argument('-o', dest='output', default='', type=str,
+                        help="Write the problems to this csv or json file")
+    parser.add_argument('--max-depth', dest='max_depth', default=5, type=int,
+                        help="Deepest allowed level below the top entry, [default: %(default)s]")
+    parser.add_argument('--max-km', dest='max_km', default=10, type=float,
+                        help="Largest allowed distance from the parent in km, [default: %(default)s]")
+    parser.add_argument('--max-days', dest='max_days', default=2, type=int,
+                        help="Largest allowed number of days from the parent, [default: %(default)s]")
+
+    # Process arguments
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(main())
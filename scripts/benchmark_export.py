@@ -0,0 +1,142 @@
+#! /usr/bin/env python3
+# encoding: utf-8
+'''
+ -- Benchmarks the Drupal escaping of the export
+
+
+@deffield    updated: Updated
+'''
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+import sys
+import time
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import numpy as np
+import pandas as pd
+import export_CSV
+
+# Values with the characters Drupal cannot read
+VALUES = ["it's", 'say "hi"', 'cost $5', 'Plain remark', '"a"=>"1, 2"',
+          "\"b\"=>\"it's $3\"", '2021-05-01T12:00:00Z: Initial read in', '', None]
+
+
+def make_catalogue(rows, seed=0, dtype=object):
+    '''
+    Generates a synthetic exported catalogue with text columns
+
+    Parameters
+    ----------
+    rows: int
+
+    seed: int, optional
+        Default: 0
+
+    dtype: optional
+        dtype of the text columns
+        Default: object
+
+    Returns
+    ----------
+    df: pandas.DataFrame
+    '''
+    rng = np.random.default_rng(seed)
+    columns = ['stationname', 'eventremarks', 'pi_name'] + export_CSV.WRAPPED_COLUMNS
+    values = np.array(VALUES, dtype=object)
+    df = pd.DataFrame({c: pd.Series(values[rng.integers(0, len(values), rows)], dtype=dtype)
+                       for c in columns})
+    df['decimallatitude'] = rng.uniform(76, 82, rows)
+    return df
+
+
+def legacy_escape(df):
+    '''
+    The escaping as it was before escape_for_drupal, for the timing and
+    the tests. Its $ pattern is a regex anchor, so dollar signs were never
+    removed.
+    '''
+    for col in export_CSV.WRAPPED_COLUMNS:
+        df[col] = '$' + df[col] + '$'
+    for col in df.columns:
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].str.replace(r"'", "", regex=True)
+            df[col] = df[col].str.replace(r'"', '*', regex=True)
+            df[col] = df[col].str.replace(r'$', '', regex=True)
+
+
+def benchmark(rows, seed=0, repeats=3):
+    '''
+    Times the legacy and the vectorised escaping
+
+    Returns
+    ----------
+    results: pandas.DataFrame
+        Best time of the repeats for every dtype and method
+    '''
+    results = []
+    for dtype in [object, 'str']:
+        df = make_catalogue(rows, seed, dtype)
+        for name, escape in [('legacy', legacy_escape),
+                             ('vectorised', export_CSV.escape_for_drupal)]:
+            times = []
+            for i in range(repeats):
+                d = df.copy()
+                t0 = time.perf_counter()
+                escape(d)
+                times.append(time.perf_counter() - t0)
+            results.append({'dtype': str(dtype), 'method': name, 'rows': rows,
+                            'seconds': round(min(times), 3),
+                            'rows/s': round(rows / min(times))})
+    return pd.DataFrame(results)
+
+
+def main():
+    '''Command line options.'''
+    args = parse_options()
+    print(benchmark(args.rows, args.seed, args.repeats).to_string(index=False))
+    return 0
+
+
+def parse_options():
+    """
+    Parse the command line options and return these.
+    """
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (
+        program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+    Created on %s.
+
+    Distributed on an "AS IS" basis without warranties
+    or conditions of any kind, either express or implied.
+
+    USAGE
+''' % (program_shortdesc, str(__date__))
+
+    # Setup argument parser
+    parser = ArgumentParser(description=program_license,
+                            formatter_class=RawDescriptionHelpFormatter)
+
+    parser.add_argument('-V', '--version', action='version',
+                        version=program_version_message)
+    parser.add_argument('-n', dest='rows', default=200000, type=int,
+                        help="Rows in the synthetic catalogue, [default: %(default)s]")
+    parser.add_argument('-r', dest='repeats', default=3, type=int,
+                        help="Repeats, the best time is reported, [default: %(default)s]")
+    parser.add_argument('--seed', dest='seed', default=0, type=int,
+                        help="Seed for the catalogue generator, [default: %(default)s]")
+
+    # Process arguments
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(main())
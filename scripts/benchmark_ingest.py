@@ -0,0 +1,386 @@
+#! /usr/bin/env python3
+# encoding: utf-8
+'''
+ -- Benchmarks the ingest into a throwaway database with synthetic sample logs
+
+
+@deffield    updated: Updated
+'''
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from psycopg2 import sql
+import datetime as dt
+import getpass
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import numpy as np
+import pandas as pd
+import init_db
+import insert
+import propegate_sql
+
+# Number of sampling activities, Niskin bottles (or other children) per
+# activity and subsamples per child
+SIZES = {"small": (10, 12, 3),
+         "medium": (100, 12, 8),
+         "large": (500, 24, 8),
+         "year": (2000, 24, 10)}
+
+# Ingest paths that can be benchmarked
+PATHS = ["row", "bulk", "row-update", "bulk-update",
+         "inherit", "inherit-cte", "inherit-memory"]
+
+GEARS = ["CTD w/bottles", "Multinet", "Box corer", "Ice corer", "WP2"]
+SAMPLE_TYPES = ["Chlorophyll a", "Nutrients", "Oxygen", "POC/PON", "DNA"]
+OTHER = ["filteredVolumeInMilliliters", "storageTemp", "fieldNotes"]
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    '''
+    Cursor counting the statements sent to the server, each is one round trip
+    '''
+    round_trips = 0
+
+    def execute(self, query, vars=None):
+        CountingCursor.round_trips += 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        CountingCursor.round_trips += len(vars_list)
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        CountingCursor.round_trips += 1
+        return super().copy_expert(sql, file, size)
+
+
+def make_sample_log(activities, children, subsamples, seed=0):
+    '''
+    Generates a synthetic sample log with the same layout as darwinsheet returns.
+    Sampling activities at the top carry the station, time and position,
+    their children (for instance Niskin bottles) a depth and bottle number
+    and the subsamples a sample type, PI and some fields that end up in other.
+
+    Parameters
+    ----------
+    activities: int
+        Number of sampling activities
+
+    children: int
+        Number of children per activity
+
+    subsamples: int
+        Number of subsamples per child
+
+    seed: int, optional
+        Seed for the random generator
+        Default: 0
+
+    Returns
+    ----------
+    data: data array
+        The header in the first row followed by the data
+
+    metadata: array
+        The metadata with the cruise number and vessel name
+    '''
+    rng = np.random.default_rng(seed)
+    header = ["eventID", "parentEventID", "stationName", "eventTime",
+              "eventDate", "decimalLatitude", "decimalLongitude", "sampleType",
+              "gearType", "sampleDepthInMeters", "bottomDepthInMeters",
+              "bottleNumber", "pi_name", "pi_email", "pi_institution",
+              "recordedBy", "eventRemarks"] + OTHER
+    n = activities * (1 + children * (1 + subsamples))
+    data = np.full((n + 1, len(header)), np.nan, dtype=object)
+    data[0, :] = header
+    col = {h: i for i, h in enumerate(header)}
+
+    start = dt.datetime(2021, 3, 1)
+    r = 1
+    for a in range(activities):
+        when = start + dt.timedelta(hours=int(rng.integers(0, 24 * 365)))
+        bottom = float(rng.integers(50, 3000))
+        activity = str(uuid.uuid4())
+        data[r, col["eventID"]] = activity
+        data[r, col["stationName"]] = "P" + str(int(rng.integers(1, 8)))
+        data[r, col["eventTime"]] = when.time()
+        data[r, col["eventDate"]] = when.date()
+        data[r, col["decimalLatitude"]] = round(float(rng.uniform(76, 82)), 4)
+        data[r, col["decimalLongitude"]] = round(float(rng.uniform(10, 35)), 4)
+        data[r, col["gearType"]] = GEARS[a % len(GEARS)]
+        data[r, col["bottomDepthInMeters"]] = bottom
+        data[r, col["recordedBy"]] = "Synthetic Recorder"
+        r += 1
+        for c in range(children):
+            child = str(uuid.uuid4())
+            data[r, col["eventID"]] = child
+            data[r, col["parentEventID"]] = activity
+            data[r, col["sampleDepthInMeters"]] = float(rng.integers(0, int(bottom)))
+            data[r, col["bottleNumber"]] = float(c + 1)
+            r += 1
+            for s in range(subsamples):
+                data[r, col["eventID"]] = str(uuid.uuid4())
+                data[r, col["parentEventID"]] = child
+                data[r, col["sampleType"]] = SAMPLE_TYPES[s % len(SAMPLE_TYPES)]
+                data[r, col["pi_name"]] = "Synthetic PI"
+                data[r, col["pi_email"]] = "pi@example.org"
+                data[r, col["pi_institution"]] = "UNIS"
+                data[r, col[OTHER[0]]] = float(rng.integers(100, 2000))
+                data[r, col[OTHER[1]]] = "-80 C"
+                if s == 0:
+                    data[r, col["eventRemarks"]] = ' Remark with "quotes", tabs\tand spaces '
+                    data[r, col[OTHER[2]]] = "Note\non two lines"
+                r += 1
+
+    metadata = np.array([["cruiseNumber", "2021703"],
+                         ["vesselName", "Kronprins Haakon"],
+                         ["title", "Synthetic benchmark cruise"]], dtype=object)
+    return data, metadata
+
+
+def create_database(dsn, name):
+    '''
+    Creates a throwaway database with the aen table
+
+    Parameters
+    ----------
+    dsn: str
+        Connection string for an existing database on the server
+
+    name: str
+        Name of the database to create
+
+    Returns
+    ----------
+    conn: psycopg2 connection
+        Connection to the new database
+    '''
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    cur = admin.cursor()
+    cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(name)))
+    cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    cur.close()
+    admin.close()
+
+    conn = psycopg2.connect(dsn, dbname=name)
+    cur = conn.cursor()
+    init_db.create_table(cur)
+    conn.commit()
+    cur.close()
+    psycopg2.extras.register_uuid()
+    psycopg2.extras.register_hstore(conn)
+    return conn
+
+
+def drop_database(dsn, name):
+    '''
+    Drops the throwaway database
+
+    Parameters
+    ----------
+    dsn: str
+        Connection string for an existing database on the server
+
+    name: str
+        Name of the database to drop
+    '''
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    cur = admin.cursor()
+    cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(name)))
+    cur.close()
+    admin.close()
+
+
+def run_path(conn, path, data, metadata, trace=False):
+    '''
+    Runs one ingest path and measures it. The memory is traced in a run of
+    its own, since tracing slows the Python code down and would skew the time.
+
+    Parameters
+    ----------
+    conn: psycopg2 connection
+
+    path: str
+        One of PATHS
+
+    data: data array
+        The sample log
+
+    metadata: array
+        The metadata of the sample log
+
+    trace: bool, optional
+        Trace the peak memory
+        Default: False
+
+    Returns
+    ----------
+    seconds: float
+        Wall clock time
+
+    round_trips: int
+        Number of statements sent to the server
+
+    peak: int
+        Peak Python memory in bytes, None if not traced
+    '''
+    cur = conn.cursor(cursor_factory=CountingCursor)
+    CountingCursor.round_trips = 0
+    if trace:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    if path == "row":
+        insert.insert_db(cur, data, metadata, "benchmark.xlsx")
+    elif path == "bulk":
+        insert.bulk_insert_db(cur, data, metadata, "benchmark.xlsx")
+    elif path == "row-update":
+        insert.insert_db(cur, data, metadata, "benchmark.xlsx",
+                         update=True, reason="Benchmark update")
+    elif path == "bulk-update":
+        insert.bulk_insert_db(cur, data, metadata, "benchmark.xlsx",
+                              update=True, reason="Benchmark update")
+    elif path.startswith("inherit"):
+        propegate_sql.inherit(cur, path.split("-")[1] if "-" in path else "traverse")
+    conn.commit()
+    seconds = time.perf_counter() - t0
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    cur.close()
+    return seconds, CountingCursor.round_trips, peak
+
+
+def benchmark(dsn, sizes, paths, seed=0):
+    '''
+    Runs the paths for every size, each in a fresh throwaway database,
+    once for the time and round trips and once for the peak memory.
+    The update and inherit paths run on a database already loaded with the
+    sample log, the updates change the remarks of every row.
+
+    Parameters
+    ----------
+    dsn: str
+        Connection string for an existing database on the server
+
+    sizes: list of str
+        Keys in SIZES
+
+    paths: list of str
+        Members of PATHS
+
+    seed: int, optional
+        Seed for the sample log generator
+        Default: 0
+
+    Returns
+    ----------
+    results: pandas.DataFrame
+        One row per size and path with rows/s, round trips and peak memory
+    '''
+    name = 'aen_bench_' + str(os.getpid())
+    results = []
+    for size in sizes:
+        data, metadata = make_sample_log(*SIZES[size], seed=seed)
+        rows = data.shape[0] - 1
+        corrected = data.copy()
+        corrected[1:, list(data[0, :]).index("eventRemarks")] = "Corrected remark"
+        for path in paths:
+            print("Running", path, "on", size, "(" + str(rows) + " rows)")
+            # Timed and traced in separate runs, each on a fresh database
+            measured = []
+            for trace in (False, True):
+                conn = create_database(dsn, name)
+                if path in ("row-update", "bulk-update") or path.startswith("inherit"):
+                    cur = conn.cursor()
+                    insert.bulk_insert_db(cur, data, metadata, "benchmark.xlsx")
+                    conn.commit()
+                    cur.close()
+                measured.append(run_path(conn, path, corrected, metadata, trace))
+                conn.close()
+            seconds, round_trips = measured[0][:2]
+            peak = measured[1][2]
+            results.append({'size': size,
+                            'path': path,
+                            'rows': rows,
+                            'seconds': round(seconds, 3),
+                            'rows/s': round(rows / seconds, 1),
+                            'round trips': round_trips,
+                            'peak MB': round(peak / 2**20, 1)})
+        drop_database(dsn, name)
+    return pd.DataFrame(results)
+
+
+def main():
+    '''Command line options.'''
+    try:
+        args = parse_options()
+        results = benchmark(args.dsn, args.sizes, args.paths, args.seed)
+        print(results.to_string(index=False))
+        if args.output:
+            results.to_csv(args.output, index=False)
+            print("Results written to", args.output)
+        return 0
+    except KeyboardInterrupt:
+        ### handle keyboard interrupt ###
+        return 0
+
+
+def parse_options():
+    """
+    Parse the command line options and return these.
+    """
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (
+        program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+    Created on %s.
+
+    Distributed on an "AS IS" basis without warranties
+    or conditions of any kind, either express or implied.
+
+    USAGE
+''' % (program_shortdesc, str(__date__))
+
+    # Setup argument parser
+    parser = ArgumentParser(description=program_license,
+                            formatter_class=RawDescriptionHelpFormatter)
+
+    parser.add_argument('-V', '--version', action='version',
+                        version=program_version_message)
+    parser.add_argument('--dsn', dest='dsn', default='dbname=postgres user=' + getpass.getuser(), type=str,
+                        help="Connection to the server, a throwaway database is created next to it. [Default: %(default)s]")
+    parser.add_argument('-s', dest='sizes', default=['small', 'medium'], nargs='+', choices=list(SIZES),
+                        help="Sizes of the synthetic sample logs, [default: %(default)s]")
+    parser.add_argument('-p', dest='paths', default=['row', 'bulk', 'row-update', 'bulk-update'], nargs='+', choices=PATHS,
+                        help="Ingest paths to measure, [default: %(default)s]")
+    parser.add_argument('--seed', dest='seed', default=0, type=int,
+                        help="Seed for the sample log generator, [default: %(default)s]")
+    parser.add_argument('-o', dest='output', default='', type=str,
+                        help="Write the results to this csv file")
+
+    # Process arguments
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(main())
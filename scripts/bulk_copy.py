@@ -0,0 +1,148 @@
+#! /usr/bin/env python3
+# encoding: utf-8
+'''
+ -- Helpers for moving rows into the database with COPY through temporary
+ staging tables
+
+
+@deffield    updated: Updated
+'''
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+import io
+import math
+from psycopg2 import sql
+
+
+def hstore_literal(dic):
+    '''
+    Write a dictionary as a hstore literal
+
+    Parameters
+    ----------
+    dic: dict
+        The dictionary to be written, values can be None
+
+    Returns
+    ----------
+    literal: str
+        The hstore text representation, for instance "a"=>"1", "b"=>NULL
+    '''
+    def quote(s):
+        return '"' + str(s).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+    pairs = []
+    for key, value in dic.items():
+        if value is None:
+            pairs.append(quote(key) + '=>NULL')
+        else:
+            pairs.append(quote(key) + '=>' + quote(value))
+    return ', '.join(pairs)
+
+
+def copy_value(value):
+    '''
+    Write a single value in the COPY text format
+
+    Parameters
+    ----------
+    value: object
+        The value to be written. None and NaN are written as NULL,
+        dictionaries as hstore and integral floats as integers so that they
+        can be read into integer columns
+
+    Returns
+    ----------
+    text: str
+        The escaped value
+    '''
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, float):
+        if math.isnan(value):
+            return '\\N'
+        if value.is_integer():
+            value = int(value)
+    if isinstance(value, dict):
+        value = hstore_literal(value)
+    return (str(value).replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def copy_buffer(rows):
+    '''
+    Write rows to a file like buffer in the COPY text format
+
+    Parameters
+    ----------
+    rows: iterable of lists
+        The rows to be written, all with the same number of values
+
+    Returns
+    ----------
+    buf: io.StringIO
+        The buffer, rewound and ready to be read by copy_expert
+    '''
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join([copy_value(v) for v in row]))
+        buf.write('\n')
+    buf.seek(0)
+    return buf
+
+
+def create_staging(cur, name, like='aen'):
+    '''
+    Create an empty temporary staging table with the same columns as a table.
+    The table lives for the rest of the session and is emptied if it exists.
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    name: str
+        The name of the staging table
+
+    like: str, optional
+        The table to copy the column definitions from
+        Default: 'aen'
+    '''
+    cur.execute(sql.SQL("CREATE TEMP TABLE IF NOT EXISTS {} (LIKE {})").format(
+        sql.Identifier(name), sql.Identifier(like)))
+    cur.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(name)))
+
+
+def copy_rows(cur, table, columns, rows):
+    '''
+    COPY rows into a table in one round trip
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    table: str
+        The name of the table
+
+    columns: list of str
+        The columns in the order of the row values
+
+    rows: iterable of lists
+        The rows to be copied, or a file like object already in
+        the COPY text format
+    '''
+    query = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(table),
+        sql.SQL(', ').join([sql.Identifier(c.lower()) for c in columns]))
+    if hasattr(rows, 'read'):
+        buf = rows
+    else:
+        buf = copy_buffer(rows)
+    cur.copy_expert(query, buf)
@@ -8,4 +8,4 @@ begin
 end
 $$ language plpgsql;
 
-update aen set other=change_hstore_key(other, 'seaWaterSalinity', 'seaWaterElectricalConductivity') where geartype LIKE '%CTD%' and exist(other, 'seaWaterSalinity') ;
+update aen set other=change_hstore_key(other, 'seaWaterSalinity', 'seaWaterElectricalConductivity') where geartype LIKE '%CTD%' and other ? 'seaWaterSalinity' ;
@@ -12,11 +12,11 @@ import pandas as pd
 import xlsxwriter
 import uuid
 import darwinsheet.config.fields as fields
+from hierarchy import Hierarchy
+import reference_data as rd
 from datetime import datetime as dt
 import os
 
-gears = pd.read_csv('scripts/darwinsheet/config/list_gear_types.csv')
-cruises = pd.read_csv('scripts/cruises.csv')
 
 DEFAULT_FONT = 'Calibri'
 DEFAULT_SIZE = 10
@@ -75,10 +75,7 @@ def find_gear_id(geartype):
     Find the persistent URI of the gear from the list_gear_types.csv file
     '''
 
-    try:
-        gear_uri = gears.loc[gears['Gear type'] == geartype, 'NVS URI'].item()
-    except:
-        gear_uri = ''
+    gear_uri = rd.lookup('gears', geartype, 'nvs_uri')
     if type(gear_uri) != str:
         gear_uri = ''
 
@@ -94,27 +91,11 @@ def findAllParents(eventIDs, metadataCatalogue):
     '''
     Finding parents, grandparents etc of all samples.
     Continuing until sample has no parenteventid registered, therefore should be the sampling activity
+    The samples themselves are left out, also when they are the parent of another sample
     '''
-
-    moreParents = True
-    #n = 0
-
-    parentEventIDs = []
-
-    while moreParents == True:
-        df = metadataCatalogue.loc[metadataCatalogue['eventid'].isin(eventIDs)]
-        newParents = df['parenteventid'].to_list()
-        newParents = [p for p in newParents if p not in eventIDs]
-        [parentEventIDs.append(p) for p in newParents if type(p) == str]
-        eventIDs = newParents
-        if len(newParents) == 0:
-            moreParents = False
-        # if n == 0: # Including sampling activities included in input file
-        #     inputSamplingActivities = df[df['parenteventid'].isna()]
-        #     parentEventIDs = parentEventIDs + inputSamplingActivities['eventid'].tolist()
-        # n = n + 1
-
-    return list(set(parentEventIDs))
+    selected = set(str(e).lower() for e in eventIDs)
+    parents = Hierarchy.from_frame(metadataCatalogue).all_ancestors(eventIDs)
+    return [p for p in parents if p not in selected]
 
 def retrieveMetadata(eventIDs, metadataCatalogue):
     # Creating new columns from the hstore key/value pairs in the 'other' column
@@ -227,7 +208,7 @@ class OutputFile:
         # Making cruise number the parenteventid of each sampling activity
         for idx, row in self.eventCoreDF.iterrows():
             if type(row['parenteventid']) != str:
-                self.eventCoreDF['parenteventid'][idx] = cruises.loc[cruises['cruiseNumber'] == row['cruisenumber'], 'wikidata'].item()
+                self.eventCoreDF['parenteventid'][idx] = rd.lookup('cruises', row['cruisenumber'], 'wikidata')
 
         for col in event_core_columns:
             if col not in self.eventCoreDF.columns:
@@ -13,17 +13,86 @@ import getpass
 import sys
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
 import numpy as np
+import os
+import threading
+import reference_data as rd
 
 __all__ = []
 __version__ = 0.1
 __date__ = '2021-06-16'
-__updated__ = '2021-08-06'
+__updated__ = '2026-10-17'
+
+# Rows transformed at a time by the streaming export
+CHUNK_ROWS = 20000
+
+# Characters Drupal cannot read, single quotes and dollar signs are removed
+# and double quotes become *. Dollar signs enclose the WRAPPED_COLUMNS.
+DRUPAL_REPLACE = [("'", ''), ('"', '*'), ('$', '')]
+DRUPAL_TABLE = str.maketrans({old: new or None for old, new in DRUPAL_REPLACE})
+WRAPPED_COLUMNS = ['metadata', 'other', 'history']
+
+
+def escape_for_drupal(df, wrapped=WRAPPED_COLUMNS):
+    '''
+    Makes the text columns readable by Drupal for the SIOS website with
+    vectorised string replacements on each column. The wrapped columns,
+    which might include ',', are enclosed in $ after the dollar signs in
+    them are removed. Numbers in columns mixing text and numbers are left
+    as they are.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Updated in place
+
+    wrapped : list of str, optional
+        Columns to enclose in $. The default is WRAPPED_COLUMNS.
+
+    Returns
+    -------
+    None.
+
+    '''
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == object:
+            kind = pd.api.types.infer_dtype(values, skipna=True)
+            if kind in ('mixed', 'mixed-integer'):
+                df[col] = values.map(lambda v: ('$' + v.translate(DRUPAL_TABLE) + '$'
+                                                if col in wrapped else v.translate(DRUPAL_TABLE))
+                                     if isinstance(v, str) else v)
+                continue
+            if kind not in ('string', 'empty'):
+                continue
+        elif not pd.api.types.is_string_dtype(values):
+            continue
+        for old, new in DRUPAL_REPLACE:
+            values = values.str.replace(old, new, regex=False)
+        if col in wrapped:
+            values = '$' + values + '$'
+        df[col] = values
+
+
+class Tee:
+    '''
+    File like object writing to several files
+    '''
+
+    def __init__(self, *files):
+        self.files = files
+
+    def write(self, data):
+        for f in self.files:
+            f.write(data)
+        return len(data)
+
 
 class MetadataCatalogue:
     
     def __init__(self, filePath):
         self.filePath = filePath
         self.filePathRaw = self.filePath.split('.')[0]+'_raw.csv'
+        self.stationCoordinates = None
 
     def export_CSV_from_psql(self):
         '''
@@ -36,6 +105,9 @@ class MetadataCatalogue:
         
         # exporting CSV
         cur.execute(f"COPY aen TO '{self.filePathRaw}' DELIMITER ',' CSV HEADER;")
+        # The reference data from the database, used by transform and the stations
+        rd.load('cruises', cur)
+        rd.load('stations', cur)
         
         conn.commit()
         cur.close()
@@ -46,6 +118,97 @@ class MetadataCatalogue:
               ''')
         
         
+    def export_stream(self, chunk_rows=CHUNK_ROWS):
+        '''
+        Exports the metadata catalogue with COPY to STDOUT on the client and
+        transforms and writes it chunk by chunk, so memory use does not grow
+        with the catalogue and no access to the files on the database host
+        is needed. The raw CSV is written next to the output as well.
+
+        The values are kept as the database writes them, where the file
+        export lets pandas guess the types of the whole catalogue. Integer
+        columns with empty values are therefore written as 3 and not 3.0.
+
+        Parameters
+        ----------
+        chunk_rows : int, optional
+            Rows transformed at a time. The default is CHUNK_ROWS.
+
+        Returns
+        -------
+        None.
+
+        '''
+        # Connect to the database as the user running the script
+        conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+        cur = conn.cursor()
+        # The reference data from the database, used by transform and the stations
+        rd.load('cruises', cur)
+        rd.load('stations', cur)
+        read_fd, write_fd = os.pipe()
+        failed = []
+
+        def produce():
+            # COPY writes into the pipe while the chunks are read from it
+            try:
+                with os.fdopen(write_fd, 'wb') as pipe, open(self.filePathRaw, 'wb') as raw:
+                    cur.copy_expert("COPY aen TO STDOUT WITH (FORMAT csv, HEADER)",
+                                    Tee(pipe, raw))
+            except Exception as e:  # Raised again in the reading thread
+                failed.append(e)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        rows = 0
+        try:
+            with os.fdopen(read_fd, 'rb') as pipe, open(self.filePath, 'w') as out:
+                # Read everything as strings, so all chunks get the same types
+                for chunk in pd.read_csv(pipe, dtype=str, chunksize=chunk_rows):
+                    self.df = chunk
+                    self.transform()
+                    self.df.to_csv(out, sep='|', index=False, header=rows == 0)
+                    rows += len(chunk)
+        except BaseException as exc:
+            producer.join()
+            # A failed COPY leaves the reader with no or truncated data, its
+            # error is the real one. A broken pipe only follows from ours.
+            if failed and not isinstance(failed[0], BrokenPipeError):
+                raise failed[0] from exc
+            raise
+        producer.join()
+        if failed:
+            raise failed[0]
+
+        # The medians of the stations are worked out on the server, on the
+        # names escaped as in the export
+        cur.execute('''
+            SELECT translate(uniquestation, '"''$', '*') AS station,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY decimallatitude),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY decimallongitude)
+            FROM aen WHERE uniquestation IS NOT NULL GROUP BY station''')
+        self.stationCoordinates = pd.DataFrame(
+            cur.fetchall(), columns=['uniquestation', 'decimallatitude', 'decimallongitude'])
+        cur.close()
+        conn.close()
+        print(f'''The following files have been created from {rows} rows, a CSV straight from PSQL without updates and one with the updates required to feed metadata into Drupal.
+{self.filePathRaw}
+{self.filePath}''')
+
+    def transform(self):
+        '''
+        Runs the updates required to feed metadata into Drupal on self.df
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.add_cruise_names_column()
+        self.update_time_column_format('created')
+        self.update_time_column_format('modified')
+        self.add_timestamp_column()
+        self.replace_strings()
+
     def open_CSV(self):
         '''
         Open CSV as pandas dataframe
@@ -62,16 +225,10 @@ class MetadataCatalogue:
         None.
 
         '''
-        cruises = pd.read_csv('cruises.csv')
-        
-        self.df['cruisename'] = ''
-        
-        for idx, row in cruises.iterrows():
-            
-            cruiseName = row['cruiseName']
-            cruiseNumber = row['cruiseNumber']
-            
-            self.df.loc[self.df['cruisenumber'] == cruiseNumber, 'cruisename'] = cruiseName
+        names = {number: row['cruisename'] for number, row in rd.load('cruises').items()}
+
+        self.df['cruisename'] = self.df['cruisenumber'].map(
+            lambda number: names.get(rd.key_value('cruises', number), ''))
     
     def update_time_column_format(self,colname):
         '''
@@ -101,34 +258,13 @@ class MetadataCatalogue:
         '''
         self.df['event_timestamp'] = self.df['eventdate']+'T'+self.df['eventtime']+'Z'
 
-    def add_symbol_beginning_and_end(self,colname):
-        '''
-        Adding a symbol at the beginning and end of each row in the column
-        To be used on columns that might include ',' which creates problems for Drupal when reading the file as a CSV
-
-        Parameters
-        ----------
-        colname : string
-            Name of column to update, which includes timestamps
-
-        Returns
-        -------
-        None.
-
-        '''
-        symbol = '$'
-        self.df[colname] = symbol + self.df[colname] + symbol
-    
     def replace_strings(self):
         '''
-        Replace strings to be compatible for Drupal for SIOS website
+        Replace strings to be compatible for Drupal for SIOS website,
+        and enclose metadata, other and history in $
 
         '''
-        for col in self.df.columns:
-            if self.df[col].dtype == object:
-                self.df[col] = self.df[col].str.replace(r"'","", regex=True)
-                self.df[col] = self.df[col].str.replace(r'"', '*', regex=True)
-                self.df[col] = self.df[col].str.replace(r'$', '', regex=True)
+        escape_for_drupal(self.df)
         
     def write_updated_CSV(self):
         '''
@@ -143,25 +279,24 @@ class MetadataCatalogue:
         Outputting a CSV of all the stations with their coordinates
         '''
         
-        stations = pd.read_csv('stations.csv') # Defined stations
-    
-        del stations['eventID'], stations['sampleType'] # Removing columns not needed
-        
-        otherStations = set(self.df['uniquestation'])  
-        
-        n = 0
-        for station in otherStations:
-            if station not in list(stations['stationName']) and type(station) == str: # Stations not already defined
-                # Calculating average coordinates for each station
-                n += 1
-                samplesdf = self.df.loc[self.df['uniquestation'] == station]
-                lat = samplesdf['decimallatitude'].median()
-                lon = samplesdf['decimallongitude'].median()
-                newRow = {'stationName': station, 'decimalLongitude': lon, 'decimalLatitude': lat}
-                stations = stations.append(newRow, ignore_index=True)
-            else:
-                pass
-        
+        stations = rd.frame('stations') # Defined stations
+        stations = stations[['stationname', 'decimallongitude', 'decimallatitude']].rename(
+            columns={'stationname': 'stationName', 'decimallongitude': 'decimalLongitude',
+                     'decimallatitude': 'decimalLatitude'})
+
+        # Median coordinates of every station, from the server for streamed exports
+        coordinates = self.stationCoordinates
+        if coordinates is None:
+            coordinates = (self.df.groupby('uniquestation')[['decimallatitude', 'decimallongitude']]
+                           .median().reset_index())
+
+        # Stations not already defined
+        coordinates = coordinates[~coordinates['uniquestation'].isin(stations['stationName'])]
+        newRows = pd.DataFrame({'stationName': coordinates['uniquestation'],
+                                'decimalLongitude': coordinates['decimallongitude'],
+                                'decimalLatitude': coordinates['decimallatitude']})
+        stations = pd.concat([stations, newRows], ignore_index=True)
+
         output_fp = self.filePath.split('.')[0] + '_stations.csv'
         
         stations.rename(columns = {'stationname': 'uniquestation'}, inplace = True)
@@ -175,17 +310,13 @@ def main():
         args = parse_options()
         filePath = args.output
         metadataCatalogue = MetadataCatalogue(filePath)
-        metadataCatalogue.export_CSV_from_psql()
-        metadataCatalogue.open_CSV()
-        metadataCatalogue.add_cruise_names_column()
-        metadataCatalogue.update_time_column_format('created')
-        metadataCatalogue.update_time_column_format('modified')
-        metadataCatalogue.add_timestamp_column()
-        metadataCatalogue.add_symbol_beginning_and_end('metadata')
-        metadataCatalogue.add_symbol_beginning_and_end('other')
-        metadataCatalogue.add_symbol_beginning_and_end('history')
-        metadataCatalogue.replace_strings()
-        metadataCatalogue.write_updated_CSV()
+        if args.stream:
+            metadataCatalogue.export_stream(args.stream)
+        else:
+            metadataCatalogue.export_CSV_from_psql()
+            metadataCatalogue.open_CSV()
+            metadataCatalogue.transform()
+            metadataCatalogue.write_updated_CSV()
         metadataCatalogue.output_stations_CSV()
         return 0
     except KeyboardInterrupt:
@@ -219,6 +350,8 @@ def parse_options():
         'output', type=str, help='''The filepath to write the csv file to''')
     parser.add_argument('-V', '--version', action='version',
                         version=program_version_message)
+    parser.add_argument('-s', '--stream', dest='stream', nargs='?', const=CHUNK_ROWS, default=0, type=int,
+                        help='''Stream the export from the client with COPY TO STDOUT and transform it in chunks of this many rows, without server file access. [Default chunk: %(const)s]''')
 
     # Process arguments
     args = parser.parse_args()
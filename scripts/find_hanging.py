@@ -14,17 +14,19 @@ import psycopg2
 import sys
 import psycopg2.extras
 import getpass
+from audit_catalogue import audit
 
 
 __all__ = []
-__version__ = 0.2
+__version__ = 0.3
 __date__ = '2018-10-03'
-__updated__ = '2021-05-25'
+__updated__ = '2026-10-17'
 
 
 def find_missing(cur):
     """
-    Goes though database table and finds missing parents
+    Goes though database table and finds missing parents.
+    The full integrity audit is in audit_catalogue.py
 
     Parameters
     ----------
@@ -32,24 +34,14 @@ def find_missing(cur):
 
     """
 
-    cur.execute('''SELECT distinct parenteventid
-            FROM aen
-            WHERE parenteventid IS NOT NULL 
-            AND 
-            parenteventid NOT IN (SELECT DISTINCT eventid FROM aen)
-            ORDER BY parenteventid ASC''')
-
-    res = cur.fetchall()
-    if res == []:
+    problems = audit(cur, ['orphan'])
+    if problems.empty:
         return
 
     print("Not registered parents:")
     print("Parent, One of the children, sample type, cruise number, source")
-    for r in res:
-        cur.execute(
-            '''SELECT eventid,sampletype,cruisenumber,source from aen where parenteventid=%s limit 1''', r)
-        c = cur.fetchone()
-        print(f'{r[0]}, {c[0]}, {c[1]}, {c[2]}, {c[3]}')
+    for _, r in problems.iterrows():
+        print(f'{r.parenteventid}, {r.eventid}, {r.sampletype}, {r.cruisenumber}, {r.source}')
 
 
 def main():
@@ -14,12 +14,13 @@ import sys
 import getpass
 from psycopg2 import sql
 import psycopg2.extras
+from apply_corrections import apply_rules
 
 
 __all__ = []
 __version__ = 0.1
 __date__ = '2018-09-25'
-__updated__ = '2019-03-22'
+__updated__ = '2026-10-17'
 
 
 COLUMNS = ["cruiseNumber",
@@ -88,8 +89,9 @@ def main():
     # Connect to the database as the user running the script
     conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
     cur = conn.cursor()
-    for key, value in rep.items():
-        replace(cur, "stationname", key, value)
+    # All the station names in one statement, see apply_corrections.py
+    apply_rules(cur, [{'action': 'remap', 'field': 'stationName', 'old': key,
+                       'new': value, 'where': ''} for key, value in rep.items()])
     conn.commit()
     cur.close()
     conn.close()
@@ -0,0 +1,255 @@
+#! /usr/bin/env python3
+# encoding: utf-8
+'''
+ -- Bulk lookups of ancestors, descendants and top sampling activities
+
+
+@deffield    updated: Updated
+'''
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+from collections import OrderedDict
+
+# Default number of eventIDs kept in each cache
+CACHE_SIZE = 100000
+
+# Deepest hierarchy followed, also stops parent cycles
+MAX_DEPTH = 100
+
+
+class LRUCache(OrderedDict):
+    '''
+    Dictionary dropping the least recently used entries when full
+    '''
+
+    def __init__(self, size=CACHE_SIZE):
+        super().__init__()
+        self.size = size
+
+    def get_many(self, keys):
+        '''
+        Returns the cached values of the keys and the keys not in the cache
+        '''
+        found = {}
+        missing = []
+        for key in keys:
+            if key in self:
+                self.move_to_end(key)
+                found[key] = self[key]
+            else:
+                missing.append(key)
+        return found, missing
+
+    def put_many(self, values):
+        self.update(values)
+        for key in values:
+            self.move_to_end(key)
+        while len(self) > self.size:
+            self.popitem(last=False)
+
+
+def is_nan(value):
+    return value is None or value != value
+
+
+class Hierarchy:
+    '''
+    Ancestors, descendants and top sampling activities for batches of eventIDs.
+
+    The lookups go to the database, one query for the whole batch, using the
+    ancestry closure table when it is installed and recursive queries
+    otherwise. A hierarchy made with from_frame works on an exported catalogue
+    instead. The results are cached, call clear when the hierarchy is changed.
+    '''
+
+    def __init__(self, cur=None, cache_size=CACHE_SIZE):
+        '''
+        Parameters
+        ----------
+        cur: psycopg2 cursor, optional
+            Cursor on the database with the aen table
+
+        cache_size: int, optional
+            Number of eventIDs kept in each cache
+            Default: CACHE_SIZE
+        '''
+        self.cur = cur
+        # Parent and child lists of every eventID in a catalogue
+        self.parents = None
+        self.children = None
+        self.closure = None
+        self.up = LRUCache(cache_size)
+        self.down = LRUCache(cache_size)
+
+    @classmethod
+    def from_frame(cls, frame, cache_size=CACHE_SIZE):
+        '''
+        Hierarchy of a catalogue in a DataFrame
+
+        Parameters
+        ----------
+        frame: pandas.DataFrame
+            With the columns eventid and parenteventid
+
+        cache_size: int, optional
+            Number of eventIDs kept in each cache
+            Default: CACHE_SIZE
+        '''
+        h = cls(cache_size=cache_size)
+        h.parents = {}
+        h.children = {}
+        for eventID, parent in zip(frame['eventid'], frame['parenteventid']):
+            if is_nan(eventID):
+                continue
+            eventID = str(eventID)
+            if not is_nan(parent):
+                h.parents[eventID] = [str(parent)]
+                h.children.setdefault(str(parent), []).append(eventID)
+        return h
+
+    def clear(self):
+        self.up.clear()
+        self.down.clear()
+
+    def has_closure(self):
+        if self.closure is None:
+            self.cur.execute("SELECT to_regclass('aen_closure') IS NOT NULL")
+            self.closure = self.cur.fetchone()[0]
+        return self.closure
+
+    def _walk(self, eventIDs, links):
+        result = {}
+        for eventID in eventIDs:
+            found = []
+            seen = {eventID}
+            todo = [eventID]
+            while todo:
+                nxt = []
+                for e in todo:
+                    for n in links.get(e) or []:
+                        if n not in seen:
+                            seen.add(n)
+                            found.append(n)
+                            nxt.append(n)
+                todo = nxt
+            result[eventID] = found
+        return result
+
+    def _query(self, eventIDs, up):
+        if self.has_closure():
+            if up:
+                query = '''SELECT descendant, ancestor FROM aen_closure
+                WHERE descendant = ANY(%s::uuid[]) AND depth > 0
+                ORDER BY descendant, depth'''
+            else:
+                query = '''SELECT ancestor, descendant FROM aen_closure
+                WHERE ancestor = ANY(%s::uuid[]) AND depth > 0
+                ORDER BY ancestor, depth'''
+            self.cur.execute(query, (eventIDs,))
+        else:
+            if up:
+                step = "JOIN aen a ON a.eventid = r.parenteventid"
+            else:
+                step = "JOIN aen a ON a.parenteventid = r.eventid"
+            self.cur.execute('''
+            WITH RECURSIVE r AS (
+                SELECT eventid AS start, eventid, parenteventid, 0 AS depth
+                FROM aen WHERE eventid = ANY(%s::uuid[])
+                UNION ALL
+                SELECT r.start, a.eventid, a.parenteventid, r.depth + 1
+                FROM r ''' + step + '''
+                WHERE r.depth < %s
+            )
+            SELECT start, eventid FROM r WHERE depth > 0
+            ORDER BY start, depth''', (eventIDs, MAX_DEPTH))
+        result = {e: [] for e in eventIDs}
+        seen = {e: set() for e in eventIDs}
+        for start, eventID in self.cur.fetchall():
+            start = str(start)
+            eventID = str(eventID)
+            if eventID not in seen[start]:
+                seen[start].add(eventID)
+                result[start].append(eventID)
+        return result
+
+    def _lookup(self, eventIDs, up):
+        cache = self.up if up else self.down
+        eventIDs = [str(e).lower() for e in eventIDs if not is_nan(e)]
+        found, missing = cache.get_many(dict.fromkeys(eventIDs))
+        if missing:
+            if self.parents is not None:
+                fetched = self._walk(missing, self.parents if up else self.children)
+            else:
+                fetched = self._query(missing, up)
+            cache.put_many(fetched)
+            found.update(fetched)
+        return found
+
+    def ancestors(self, eventIDs):
+        '''
+        The ancestor chains of the eventIDs
+
+        Parameters
+        ----------
+        eventIDs: list of str
+
+        Returns
+        ----------
+        ancestors: dict
+            For each eventID the list of ancestors, the parent first and the
+            top sampling activity last. Empty for top entries and unknown
+            eventIDs
+        '''
+        return self._lookup(eventIDs, True)
+
+    def descendants(self, eventIDs):
+        '''
+        The descendants of the eventIDs
+
+        Parameters
+        ----------
+        eventIDs: list of str
+
+        Returns
+        ----------
+        descendants: dict
+            For each eventID the list of descendants, the children first
+        '''
+        return self._lookup(eventIDs, False)
+
+    def roots(self, eventIDs):
+        '''
+        The top sampling activities of the eventIDs
+
+        Parameters
+        ----------
+        eventIDs: list of str
+
+        Returns
+        ----------
+        roots: dict
+            For each eventID its top sampling activity, which is itself for
+            top entries
+        '''
+        return {e: a[-1] if a else e for e, a in self.ancestors(eventIDs).items()}
+
+    def all_ancestors(self, eventIDs):
+        '''
+        The union of the ancestors of the eventIDs
+
+        Parameters
+        ----------
+        eventIDs: list of str
+
+        Returns
+        ----------
+        ancestors: list of str
+        '''
+        found = {}
+        for chain in self.ancestors(eventIDs).values():
+            found.update(dict.fromkeys(chain))
+        return list(found)
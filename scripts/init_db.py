@@ -12,7 +12,7 @@
 __all__ = []
 __version__ = 0.1
 __date__ = '2019-03-22'
-__updated__ = '2019-03-22'
+__updated__ = '2026-10-17'
 
 import psycopg2
 import psycopg2.extras
@@ -48,12 +48,28 @@ CREATE TABLE aen (eventID uuid PRIMARY KEY,
                               source text) '''
 
 
-# Connect to the database as the user running the script
-conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
-cur = conn.cursor()
-cur.execute("CREATE EXTENSION IF NOT EXISTS hstore;")
-cur.execute(exe_str)
-cur.execute("GRANT ALL privileges ON TABLE public.aen TO aen_user;")
-conn.commit()
-cur.close()
-conn.close()
+def create_table(cur):
+    '''
+    Creates the hstore extension and the aen table
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+    '''
+    cur.execute("CREATE EXTENSION IF NOT EXISTS hstore;")
+    cur.execute(exe_str)
+
+
+def main():
+    # Connect to the database as the user running the script
+    conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+    cur = conn.cursor()
+    create_table(cur)
+    cur.execute("GRANT ALL privileges ON TABLE public.aen TO aen_user;")
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
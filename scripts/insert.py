@@ -12,20 +12,30 @@
 __all__ = []
 __version__ = 0.2
 __date__ = '2018-09-12'
-__updated__ = '2021-03-10'
+__updated__ = '2026-10-17'
 
 import psycopg2
 import psycopg2.extras
 import darwinsheet.scripts.process_xlsx as px
+import darwinsheet.config.fields as fields
 import datetime as dt
 import getpass
 import glob
+import hashlib
+import json
 import sys
 import os
+import re
+import multiprocessing
+import uuid
+import openpyxl
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import io
 import numpy as np
+import pandas as pd
 from collections import OrderedDict
 from psycopg2 import sql
+import bulk_copy as bc
 
 
 # columns = {"parentEventID": "uuid",
@@ -91,6 +101,54 @@ COLUMNS = ["eventID",
            "recordedBy",
            "eventRemarks"]
 
+# Temporary table used by the bulk ingest
+STAGING = "aen_staging"
+
+# What the batch ingest does with files with errors.
+# ingest-valid inserts the rows that pass check_batch, and skips the file if
+# any error is not in a row check_batch leaves out
+ERROR_POLICIES = ["skip", "abort", "ingest-valid"]
+
+# The row number in an error line of px.run or check_batch
+ERROR_ROW = re.compile(r'\bRow:?\s*(\d+)', re.IGNORECASE)
+
+# Table recording the files completed by a run, for --resume
+CHECKPOINT = "ingest_checkpoint"
+
+# Sample log formats, xlsx is parsed and validated by darwinsheet
+SAMPLE_LOGS = [".xlsx", ".csv", ".tsv", ".parquet"]
+
+# Suffix of the csv file holding the metadata of a csv, tsv or parquet log
+METADATA_SUFFIX = "_metadata.csv"
+
+# Sheets read by the streaming ingest
+DATA_SHEET = "Data"
+METADATA_SHEET = "Metadata"
+
+# Data validation used for the formats of fields without one
+FORMAT_VALIDATION = {"int": "integer",
+                     "integer": "integer",
+                     "double precision": "decimal",
+                     "date": "date",
+                     "time": "time"}
+
+# The criteria of the data validations, by name and as operators
+CRITERIA = {"equal to": "==",
+            "not equal to": "!=",
+            "greater than": ">",
+            "less than": "<",
+            "greater than or equal to": ">=",
+            "less than or equal to": "<="}
+COMPARE = {"==": lambda v, x: v == x,
+           "!=": lambda v, x: v != x,
+           ">": lambda v, x: v > x,
+           "<": lambda v, x: v < x,
+           ">=": lambda v, x: v >= x,
+           "<=": lambda v, x: v <= x}
+
+# Table recording the files already ingested, keyed by content hash
+MANIFEST = "ingest_manifest"
+
 
 def to_dict(keys, values):
     '''
@@ -198,87 +256,249 @@ def get_time_now():
     return dt.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
 
 
-def insert_db(cur, data, metadata, filename, update=False, reason=''):
+def split_metadata(metadata):
     '''
-    This inserts the data into the database, alternatively updates the fields
+    Reads the metadata sheet and takes out the cruise number and vessel name
 
     Parameters
     ----------
-    cur : psycopg2 cursor
-        Database cursor
-
-    data : data array
-        the data to be inserted with header for every column
-
     metadata : array
-        The metadata to be inserted
-
-    filename : str
-        The source filename
+        The metadata from the metadata sheet
 
-    update : Boolean, optional
-        Determines if fields are updated.
-        Default: False
+    Returns
+    ----------
+    meta : dict
+        The metadata for the metadata hstore
 
-    reason : str, optional
-        Reason for update
-        Default: ''
+    cruiseNumber : int or str
+        The cruise number, '' if not given
 
+    vesselName : str
+        The vessel name, '' if not given
     '''
     try:
         meta = to_dict(metadata[:, 0], metadata[:, 1])
     except IndexError:
         meta = {}
     #print(meta)
-    
-    stat = ""
-    fields = ""
-    fields_up = ""  # For update statement
-    indxs = []
-    exists_query = '''
-    select exists(
-        select 1
-        from aen
-        where eventid= %s
-    )'''
-    
-    for r in COLUMNS:
-        if any(data[0, :] == r):
-            indxs.append(np.where(data[0, :] == r)[0][0])
-            fields = fields + r + ", "
-            if r != COLUMNS[0]:  # Don't insert eventid in fields_up
-                fields_up = fields_up + r + "=%s, "
-            stat = stat + "%s,"
-    
+
     # Vessel name and cruise number are now (March 2021-) from the metadata sheet, only entered once
     # However, they are included for each sample, in line with previous practice.
     # They must therefore be removed from the meta dictionary and added as fields (cruiseNumber) or to other (vesselName)
     try:
         cruiseNumber = int(meta['cruiseNumber'])
-        stat = stat + '%s,'
-        fields = fields + 'cruiseNumber, '
-        fields_up = fields_up + 'cruiseNumber=%s, '
     except:
         cruiseNumber = ''
-    try:
-        meta.pop('cruiseNumber')
-    except:
-        pass
-    try:
-        vesselName = meta['vesselName']
-        meta.pop('vesselName')
-    except:
-        vesselName = ''
+    meta.pop('cruiseNumber', None)
+    vesselName = meta.pop('vesselName', '')
+    return meta, cruiseNumber, vesselName
+
+
+def copy_text(values, trim=True):
+    '''
+    Formats a whole column in the COPY text format in one pass.
+    NaN and None become NULL, strings are stripped and escaped and
+    integral floats are written as integers.
+
+    Parameters
+    ----------
+    values : array
+        The values of the column
+
+    trim : Boolean, optional
+        Strip extra white space from strings
+        Default: True
+
+    Returns
+    ----------
+    text : array of str
+        The formatted values
+    '''
+    col = pd.Series(values, dtype=object)
+    null = col.isna().to_numpy()
+    kind = pd.api.types.infer_dtype(col, skipna=True)
+    if kind == 'string':
+        text = col.where(~null, '')
+        if trim:
+            text = text.str.strip()
+        text = (text.str.replace('\\', '\\\\', regex=False)
+                .str.replace('\t', '\\t', regex=False)
+                .str.replace('\n', '\\n', regex=False)
+                .str.replace('\r', '\\r', regex=False)).to_numpy()
+    elif kind in ('floating', 'integer', 'mixed-integer-float'):
+        num = col.astype(float).to_numpy()
+        whole = np.nan_to_num(num)
+        integral = (whole == np.floor(whole)) & (np.abs(whole) < 2**53)
+        text = np.where(integral,
+                        np.where(integral, whole, 0).astype(np.int64).astype(str),
+                        num.astype(str))
+    else:
+        # Dates, times and mixed columns
+        text = [bc.copy_value(v.strip() if trim and isinstance(v, str) else v)
+                for v in col]
+    return np.where(null, '\\N', np.asarray(text, dtype=object))
+
+
+def hstore_text(keys, values):
+    '''
+    Builds the hstore literal of every row from a block of columns,
+    one column at a time instead of one row at a time
+
+    Parameters
+    ----------
+    keys : array of str
+        The header of the columns, used as keys
+
+    values : 2D array
+        The values, one row per data row and one column per key
+
+    Returns
+    ----------
+    literal : array of str
+        The hstore literal of every row
+    '''
+    def escape(text):
+        return text.str.replace('\\', '\\\\', regex=False).str.replace('"', '\\"', regex=False)
+
+    literal = pd.Series([''] * values.shape[0], dtype=object)
+    for i in sorted(range(len(keys)), key=lambda i: str(keys[i])):
+        if pd.isna(keys[i]):
+            continue
+        col = pd.Series(values[:, i], dtype=object)
+        null = col.isna()
+        key = str(keys[i]).replace('\\', '\\\\').replace('"', '\\"')
+        pair = ('"' + key + '"=>"') + escape(col.where(~null, '').astype(str)) + '"'
+        pair = pair.where(~null, '')
+        sep = pd.Series(np.where((literal != '') & ~null, ', ', ''), dtype=object)
+        literal = literal + sep + pair
+    return literal.to_numpy()
+
+
+def shape_columns(data, metadata, constants=()):
+    '''
+    Shapes the data sheet into a buffer ready for COPY in one columnar pass.
+    Does the same as shape_rows, but a column at a time.
+
+    Parameters
+    ----------
+    data : data array
+        the data with header for every column
+
+    metadata : array
+        The metadata from the metadata sheet
+
+    constants : list of tuples, optional
+        Fields and values added to every row, for instance created
+        Default: ()
+
+    Returns
+    ----------
+    fields : list of str
+        The database fields in the order of the values in the buffer.
+        other and metadata come before the constants
+
+    buf : io.StringIO
+        The rows in the COPY text format
+
+    rows : int
+        The number of rows in the buffer
+    '''
+    meta, cruiseNumber, vesselName = split_metadata(metadata)
+
+    # Look up every header once instead of one np.where per column
+    header = data[0, :]
+    first = {}
+    for i, h in enumerate(header):
+        if isinstance(h, str):
+            first.setdefault(h, i)
+
+    fields = []
+    indxs = []
+    for r in COLUMNS:
+        if r in first:
+            indxs.append(first[r])
+            fields.append(r)
+
+    body = data[1:, :]
+    if COLUMNS[0] in first:
+        body = body[~pd.isna(body[:, first[COLUMNS[0]]])]
+    else:
+        body = body[:0]
+    n = body.shape[0]
+
+    def constant(value):
+        return np.full(n, bc.copy_value(value), dtype=object)
+
+    columns = [copy_text(body[:, i]) for i in indxs]
+    if cruiseNumber != '':
+        fields.append('cruiseNumber')
+        columns.append(constant(cruiseNumber))
 
     o_indxs = find_missing(indxs, data.shape[1])
+    keys = list(header[o_indxs])
+    values = body[:, o_indxs]
+    if vesselName != '':
+        # The vessel name from the metadata sheet replaces any column
+        keep = [i for i, k in enumerate(keys) if k != 'vesselName']
+        keys = [keys[i] for i in keep] + ['vesselName']
+        values = np.column_stack([values[:, keep],
+                                  np.full(n, vesselName, dtype=object)])
+    columns.append(copy_text(hstore_text(keys, values), trim=False))
+    columns.append(constant(meta))
+    fields = fields + ['other', 'metadata']
 
-    stat = stat + "%s,%s,%s,%s,%s,%s"  # For the other and metadata
-    fields = fields + "other, metadata, created, modified, history, source"
-    fields_up = fields_up + \
-        "other = other || %s , metadata = metadata || %s, modified = %s, history = %s, source = %s"
+    for field, value in constants:
+        fields.append(field)
+        columns.append(constant(value))
+
+    buf = io.StringIO()
+    buf.write('\n'.join(map('\t'.join, zip(*columns))))
+    if n:
+        buf.write('\n')
+    buf.seek(0)
+    return fields, buf, n
 
+
+def shape_rows(data, metadata):
+    '''
+    Shape the data sheet into rows of database values
+
+    Parameters
+    ----------
+    data : data array
+        the data with header for every column
+
+    metadata : array
+        The metadata from the metadata sheet
+
+    Returns
+    ----------
+    fields : list of str
+        The database fields in the order of the values in each row.
+        The last two are always other and metadata
+
+    rows : list of lists
+        The values for every data row with an eventID
+    '''
+    meta, cruiseNumber, vesselName = split_metadata(metadata)
+
+    fields = []
+    indxs = []
+
+    for r in COLUMNS:
+        if any(data[0, :] == r):
+            indxs.append(np.where(data[0, :] == r)[0][0])
+            fields.append(r)
+
+    if cruiseNumber != '':
+        fields.append('cruiseNumber')
+
+    o_indxs = find_missing(indxs, data.shape[1])
+
+    fields = fields + ['other', 'metadata']
+
+    rows = []
     for r in range(1, data.shape[0]):
-        # row = []
         cols = data[r, indxs].tolist()
         cols = replace_nan(cols)
         cols = trim_str(cols)
@@ -291,6 +511,64 @@ def insert_db(cur, data, metadata, filename, update=False, reason=''):
         cols.append(meta)
         if cols[0] == None:
             continue
+        rows.append(cols)
+    return fields, rows
+
+
+def insert_db(cur, data, metadata, filename, update=False, reason=''):
+    '''
+    This inserts the data into the database, alternatively updates the fields
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+
+    data : data array
+        the data to be inserted with header for every column
+
+    metadata : array
+        The metadata to be inserted
+
+    filename : str
+        The source filename
+
+    update : Boolean, optional
+        Determines if fields are updated.
+        Default: False
+
+    reason : str, optional
+        Reason for update
+        Default: ''
+
+    Returns
+    ----------
+    inserted : int
+        The number of inserted rows
+
+    updated : int
+        The number of updated rows
+    '''
+    fields, rows = shape_rows(data, metadata)
+    inserted = 0
+    updated = 0
+
+    exists_query = '''
+    select exists(
+        select 1
+        from aen
+        where eventid= %s
+    )'''
+
+    stat = "%s," * len(fields) + "%s,%s,%s,%s"
+    fields_up = ""  # For update statement
+    for r in fields[1:-2]:  # Don't insert eventid in fields_up
+        fields_up = fields_up + r + "=%s, "
+    fields_up = fields_up + \
+        "other = other || %s , metadata = metadata || %s, modified = %s, history = %s, source = %s"
+    fields = ", ".join(fields) + ", created, modified, history, source"
+
+    for cols in rows:
         cur.execute(exists_query, (cols[0],))
         exists = cur.fetchone()[0]
         query3 = sql.SQL("SELECT history from aen where eventid = %s")
@@ -303,6 +581,7 @@ def insert_db(cur, data, metadata, filename, update=False, reason=''):
             cols.append(filename)  # Source file
             cur.execute(
                 "INSERT INTO aen (" + fields + ") VALUES(" + stat + ")", cols)
+            inserted = inserted + 1
         elif update:
 
             # Need to extract created and history
@@ -327,45 +606,1213 @@ def insert_db(cur, data, metadata, filename, update=False, reason=''):
             temp.append(temp[0])
             cur.execute(
                 "UPDATE aen set " + fields_up + " where eventid = %s", temp[1:])
+            updated = updated + 1
         else:
             print("Skipping due to duplicate id " + cols[0])
             continue
+    return inserted, updated
 
 
-def main(argv=None):  # IGNORE:C0111
-    '''Command line options.'''
-    try:
-        args = parse_options()
-        files = args.input
-        # Connect to the database as the user running the script
-        conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
-        psycopg2.extras.register_uuid()
-        psycopg2.extras.register_hstore(conn)
+def bulk_update_db(cur, fields, filename, reason=''):
+    '''
+    Updates the existing eventIDs in the staging table with one statement.
+    The other and metadata hstores are merged, modified is set and the
+    reason is appended to the history on the server.
+    Only rows where something actually changes are updated.
 
-        cur = conn.cursor()
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
 
-        if os.path.isfile(files):
-            urls = []
-            urls.append(files)
-        else:
-            urls = glob.glob(os.path.join(files, '*.xlsx'))
+    fields : list of str
+        The fields from the sheet, as returned by shape_rows
 
-        for url in urls:
-            print("Url", url)
-            good, error, data, metadata = px.run(url, return_data=True)
+    filename : str
+        The source filename
 
-            if not(good):
-                print("Errors found")
-                for line in error:
-                    print(line)
-                print("Should we continue? [y/n]")
-                answer = input().lower()
-                if answer != 'y':
-                    continue
-            filename = os.path.basename(url)
-            insert_db(cur, data, metadata, filename, args.update, args.mod)
+    reason : str, optional
+        Reason for update, asked for if empty
+        Default: ''
+
+    Returns
+    ----------
+    summary : list of tuples
+        The eventID and the list of changed fields for every updated row
+    '''
+    cur.execute(sql.SQL('''
+    SELECT count(*) FROM {0} s
+    WHERE EXISTS (SELECT 1 FROM aen a WHERE a.eventid = s.eventid)''').format(
+        sql.Identifier(STAGING)))
+    if cur.fetchone()[0] == 0:
+        return []
+
+    if reason == '':
+        print("What is the reason for the update of " + filename +
+              " (is appended to the history):")
+        reason = input()
+
+    sets = []
+    changes = []
+    for f in fields[1:-2]:  # Don't update eventid, other and metadata are merged
+        col = sql.Identifier(f.lower())
+        sets.append(sql.SQL("{0} = s.{0}").format(col))
+        changes.append(sql.SQL("CASE WHEN o.{0} IS DISTINCT FROM s.{0} THEN {1} END").format(
+            col, sql.Literal(f)))
+    for f in fields[-2:]:
+        col = sql.Identifier(f)
+        merged = sql.SQL("coalesce(o.{0}, ''::hstore) || coalesce(s.{0}, ''::hstore)").format(col)
+        sets.append(sql.SQL("{0} = {1}").format(col, merged))
+        changes.append(sql.SQL("CASE WHEN coalesce(o.{0}, ''::hstore) IS DISTINCT FROM {1} THEN {2} END").format(
+            col, merged, sql.Literal(f)))
+    changed = sql.SQL("array_remove(ARRAY[{}]::text[], NULL)").format(
+        sql.SQL(', ').join(changes))
+
+    modified = get_time_now()
+    # The second reference to aen (o) sees the rows as they were before the update
+    query = sql.SQL('''
+    UPDATE aen a SET {sets},
+        modified = %(modified)s,
+        history = concat_ws(E'\\n', a.history, %(line)s),
+        source = %(source)s
+    FROM (SELECT DISTINCT ON (eventid) * FROM {staging}) s, aen o
+    WHERE a.eventid = s.eventid AND o.eventid = a.eventid
+    AND cardinality({changed}) > 0
+    RETURNING a.eventid, {changed}''').format(
+        sets=sql.SQL(', ').join(sets),
+        staging=sql.Identifier(STAGING),
+        changed=changed)
+    cur.execute(query, {'modified': modified,
+                        'line': modified + ": " + reason,
+                        'source': filename})
+    return [(str(r[0]), r[1]) for r in cur.fetchall()]
+
+
+def bulk_insert_db(cur, data, metadata, filename, update=False, reason=''):
+    '''
+    Inserts the data into the database in bulk. The rows are copied into a
+    temporary staging table and all new eventIDs are inserted with one
+    statement, so the number of round trips does not grow with the rows.
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+
+    data : data array
+        the data to be inserted with header for every column
+
+    metadata : array
+        The metadata to be inserted
+
+    filename : str
+        The source filename
+
+    update : Boolean, optional
+        Determines if existing eventIDs are updated with bulk_update_db.
+        Default: False
+
+    reason : str, optional
+        Reason for update
+        Default: ''
+
+    Returns
+    ----------
+    inserted : int
+        The number of inserted rows
+
+    summary : list of tuples
+        The eventID and changed fields for every updated row
+    '''
+    created = get_time_now()
+    columns, buf, n = shape_columns(
+        data, metadata, [('created', created),
+                         ('modified', created),
+                         ('history', created + ": Initial read in of the log files."),
+                         ('source', filename)])
+    if n == 0:
+        return 0, []
+    fields = columns[:-4]
+
+    bc.create_staging(cur, STAGING)
+    bc.copy_rows(cur, STAGING, columns, buf)
+
+    if update:
+        # Update before inserting, otherwise the new rows would match as well
+        summary = bulk_update_db(cur, fields, filename, reason)
+    else:
+        summary = []
+        cur.execute(sql.SQL('''
+        SELECT DISTINCT s.eventid
+        FROM {0} s JOIN aen a ON a.eventid = s.eventid
+        ORDER BY s.eventid''').format(sql.Identifier(STAGING)))
+        for r in cur.fetchall():
+            print("Skipping due to duplicate id " + str(r[0]))
+
+    columns = sql.SQL(', ').join([sql.Identifier(f.lower()) for f in columns])
+    cur.execute(sql.SQL('''
+    INSERT INTO aen ({0})
+    SELECT {0} FROM {1}
+    ON CONFLICT (eventid) DO NOTHING''').format(columns, sql.Identifier(STAGING)))
+    return cur.rowcount, summary
+
+
+def is_xlsx(url):
+    '''
+    Checks if a sample log is a spreadsheet or a machine generated table
+
+    Parameters
+    ----------
+    url : str
+        Path to the sample log
+
+    Returns
+    ----------
+    xlsx : Boolean
+        True for xlsx files
+    '''
+    return os.path.splitext(url)[1].lower() == '.xlsx'
+
+
+def read_table(url, **kwargs):
+    '''
+    Reads a csv, tsv or parquet sample log with one header row
+
+    Parameters
+    ----------
+    url : str
+        Path to the sample log
+
+    kwargs :
+        Passed on to pandas.read_csv, for instance chunksize
+
+    Returns
+    ----------
+    table : pandas.DataFrame or iterator of pandas.DataFrame
+        The sample log
+    '''
+    ext = os.path.splitext(url)[1].lower()
+    if ext == '.parquet':
+        return pd.read_parquet(url)
+    # Only empty cells are missing, NA and similar are kept as text
+    kwargs = dict({'keep_default_na': False, 'na_values': ['']}, **kwargs)
+    if ext == '.tsv':
+        return pd.read_csv(url, sep='\t', **kwargs)
+    return pd.read_csv(url, **kwargs)
+
+
+def table_to_array(table):
+    '''
+    Turns a table into the same data array as darwinsheet returns
+
+    Parameters
+    ----------
+    table : pandas.DataFrame
+        The sample log
+
+    Returns
+    ----------
+    data : data array
+        The header in the first row followed by the data
+    '''
+    header = np.array(list(table.columns), dtype=object).reshape(1, -1)
+    return np.concatenate([header, table.to_numpy(dtype=object)])
+
+
+def metadata_keys():
+    '''
+    The keys that can be on the metadata sheet, the fields defined in
+    darwinsheet and the cruise number and vessel name
+
+    Returns
+    ----------
+    keys : set of str
+    '''
+    return set(f['name'] for f in fields.fields) | {'cruiseNumber', 'vesselName'}
+
+
+def read_metadata(url, sheet=METADATA_SHEET):
+    '''
+    Reads the metadata sheet without loading the data sheet.
+    The known metadata keys are read from the column holding most of them
+    and the values from the column to the right, blank values are left out.
+    For csv, tsv and parquet logs the metadata is read from a csv file next
+    to the log, with the suffix METADATA_SUFFIX and a key and value per line.
+
+    Parameters
+    ----------
+    url : str
+        Path to the sample log
+
+    sheet : str, optional
+        The name of the metadata sheet
+        Default: METADATA_SHEET
+
+    Returns
+    ----------
+    metadata : array
+        The keys in the first column and the values in the second
+    '''
+    if not is_xlsx(url):
+        path = os.path.splitext(url)[0] + METADATA_SUFFIX
+        if not os.path.isfile(path):
+            return np.empty((0, 2), dtype=object)
+        meta = pd.read_csv(path, header=None, dtype=str, keep_default_na=False, na_values=[''])
+        return meta.iloc[:, :2].to_numpy(dtype=object)
+
+    wb = openpyxl.load_workbook(url, read_only=True, data_only=True)
+    try:
+        if sheet not in wb.sheetnames:
+            return np.empty((0, 2), dtype=object)
+        rows = list(wb[sheet].iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+    # The column with most of the known keys, the display names are before it
+    known = metadata_keys()
+    counts = {}
+    for row in rows:
+        for i, cell in enumerate(row):
+            if isinstance(cell, str) and cell.strip() in known:
+                counts[i] = counts.get(i, 0) + 1
+    if not counts:
+        return np.empty((0, 2), dtype=object)
+    col = max(counts, key=counts.get)
+
+    pairs = []
+    for row in rows:
+        if len(row) <= col + 1 or not isinstance(row[col], str):
+            continue
+        key = row[col].strip()
+        value = row[col + 1]
+        if key not in known or value is None or (isinstance(value, str) and value.strip() == ''):
+            continue
+        pairs.append([key, value])
+    return np.array(pairs, dtype=object).reshape(-1, 2)
+
+
+def iter_batches(url, batch_size, sheet=DATA_SHEET):
+    '''
+    Reads the data sheet in batches of rows, so that only one batch is
+    kept in memory at the time
+
+    Parameters
+    ----------
+    url : str
+        Path to the sample log
+
+    batch_size : int
+        The number of rows in each batch
+
+    sheet : str, optional
+        The name of the data sheet
+        Default: DATA_SHEET
+
+    Yields
+    ----------
+    data : data array
+        The header row, the row with eventID, followed by the rows of the batch
+    '''
+    ext = os.path.splitext(url)[1].lower()
+    if ext == '.parquet':
+        # pyarrow is only needed for parquet logs
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(url).iter_batches(batch_size=batch_size):
+            yield table_to_array(batch.to_pandas())
+        return
+    elif ext != '.xlsx':
+        for chunk in read_table(url, chunksize=batch_size):
+            yield table_to_array(chunk)
+        return
+
+    wb = openpyxl.load_workbook(url, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet].iter_rows(values_only=True)
+        header = None
+        for row in rows:
+            if COLUMNS[0] in row:
+                header = row
+                break
+        if header is None:
+            return
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield np.array([header] + batch, dtype=object)
+                batch = []
+        if batch:
+            yield np.array([header] + batch, dtype=object)
+    finally:
+        wb.close()
+
+
+def is_filled(values):
+    '''
+    Finds the cells with a value, NaN, None and blank strings are empty
+
+    Parameters
+    ----------
+    values : pandas.Series
+
+    Returns
+    ----------
+    filled : pandas.Series of Boolean
+    '''
+    return ~(values.isna() | values.map(lambda v: isinstance(v, str) and v.strip() == ''))
+
+
+def bound(value, dates=False):
+    '''
+    A limit of a data validation that can be compared in Python.
+    Formulas, like =TODAY(), can not and are None.
+    '''
+    if dates:
+        if isinstance(value, (dt.date, dt.datetime)):
+            return pd.Timestamp(value)
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def in_criteria(values, valid, dates=False):
+    '''
+    Applies the criteria of a darwinsheet data validation, for instance
+    between a minimum and a maximum
+
+    Parameters
+    ----------
+    values : pandas.Series
+        Numbers, lengths or timestamps
+
+    valid : dict
+        The data validation of the field
+
+    dates : Boolean, optional
+        The values and limits are dates
+        Default: False
+
+    Returns
+    ----------
+    ok : pandas.Series of Boolean
+    '''
+    criteria = CRITERIA.get(valid.get('criteria', 'between'), valid.get('criteria'))
+    ok = pd.Series(True, index=values.index)
+    if criteria in ('between', 'not between'):
+        low = bound(valid.get('minimum'), dates)
+        high = bound(valid.get('maximum'), dates)
+        if low is not None:
+            ok &= values >= low
+        if high is not None:
+            ok &= values <= high
+        if criteria == 'not between' and low is not None and high is not None:
+            ok = ~ok
+        return ok
+    limit = bound(valid.get('value', valid.get('minimum')), dates)
+    if limit is None or criteria not in COMPARE:
+        return ok
+    return COMPARE[criteria](values, limit)
+
+
+def to_date(value):
+    '''
+    Reads a date from a cell, NaT if it is not a date
+    '''
+    if value is None or isinstance(value, dt.time):
+        return pd.NaT
+    when = pd.to_datetime(value, errors='coerce')
+    if isinstance(when, pd.Timestamp) and when.tzinfo is not None:
+        when = when.tz_convert(None)
+    return when if isinstance(when, pd.Timestamp) else pd.NaT
+
+
+def is_time(value):
+    '''
+    Checks a time from a cell, a time object or a string like 13:45
+    '''
+    if isinstance(value, (dt.time, dt.datetime)):
+        return True
+    try:
+        dt.time.fromisoformat(str(value).strip())
+        return True
+    except ValueError:
+        return False
+
+
+def check_column(values, field):
+    '''
+    Validates a column against its darwinsheet field definition. The data
+    validation of the field is used, and the format when it has none, so
+    values that can not be written to the database are also found.
+
+    Parameters
+    ----------
+    values : array
+        The values of the column
+
+    field : dict
+        The field definition
+
+    Returns
+    ----------
+    bad : array of Boolean
+        True for the filled values that are not valid
+    '''
+    col = pd.Series(values, dtype=object)
+    filled = is_filled(col)
+    valid = field.get('valid', {}) or {}
+    fmt = field.get('format', '')
+    kind = valid.get('validate', 'any')
+    if kind == 'any':
+        kind = FORMAT_VALIDATION.get(fmt, 'any')
+
+    if fmt == 'uuid' or field['name'] in COLUMNS[:2]:
+        ok = col.map(lambda v: is_uuid(v))
+    elif kind in ('decimal', 'integer'):
+        num = pd.to_numeric(col.where(filled, np.nan), errors='coerce')
+        ok = num.notna()
+        if kind == 'integer':
+            ok &= (num % 1 == 0)
+        ok &= in_criteria(num, valid)
+    elif kind == 'date':
+        when = col.where(filled, None).map(to_date)
+        ok = when.notna() & in_criteria(when, valid, dates=True)
+    elif kind == 'time':
+        ok = col.map(is_time)
+    elif kind == 'list' and isinstance(valid.get('source'), (list, tuple)):
+        ok = col.map(lambda v: str(v).strip()).isin([str(s) for s in valid['source']])
+    elif kind == 'length':
+        ok = in_criteria(col.map(lambda v: len(str(v).strip())), valid)
+    else:
+        return np.zeros(len(col), dtype=bool)
+    return (filled & ~ok.fillna(False).astype(bool)).to_numpy()
+
+
+def is_uuid(value):
+    '''
+    Checks that a value is a valid uuid
+    '''
+    try:
+        uuid.UUID(str(value).strip())
+        return True
+    except ValueError:
+        return False
+
+
+def check_batch(data, offset=0, metadata=None):
+    '''
+    Validates the rows of a batch with the field definitions from
+    darwinsheet, so the rows can be checked one batch at the time.
+    The required columns must be in the header, and every filled value
+    must pass the data validation of its field.
+
+    Parameters
+    ----------
+    data : data array
+        The batch with header for every column
+
+    offset : int, optional
+        The number of data rows before this batch, for the error messages
+        Default: 0
+
+    metadata : array, optional
+        The metadata, a cruise number on the metadata sheet is not needed
+        in the data
+        Default: None
+
+    Returns
+    ----------
+    keep : array of Boolean
+        True for the header and the rows that can be inserted
+
+    error : list of str
+        The errors found
+    '''
+    keep = np.ones(data.shape[0], dtype=bool)
+    error = []
+    header = data[0, :]
+    first = {}
+    for i, h in enumerate(header):
+        if isinstance(h, str):
+            first.setdefault(h.strip(), i)
+
+    given = set()
+    if metadata is not None and split_metadata(metadata)[1] != '':
+        given.add('cruiseNumber')
+    missing = [r for r in REQUIERED if r not in first and r not in given]
+    if missing:
+        keep[1:] = False
+        error.append("Required columns missing: " + ", ".join(missing))
+        return keep, error
+
+    # Rows without eventID are not inserted, they are only errors if filled
+    body = data[1:, :]
+    has_id = is_filled(pd.Series(body[:, first[COLUMNS[0]]], dtype=object)).to_numpy()
+    others = np.zeros(body.shape[0], dtype=bool)
+    for i in range(body.shape[1]):
+        others |= is_filled(pd.Series(body[:, i], dtype=object)).to_numpy()
+    for r in np.where(others & ~has_id)[0]:
+        keep[r + 1] = False
+        error.append("Row " + str(offset + r + 1) + ": " + COLUMNS[0] + " is missing")
+
+    definitions = dict((f['name'], f) for f in fields.fields)
+    for name, i in first.items():
+        field = definitions.get(name, {'name': name} if name in COLUMNS[:2] else None)
+        if field is None:
+            continue
+        bad = check_column(body[:, i], field) & has_id
+        for r in np.where(bad)[0]:
+            keep[r + 1] = False
+            error.append("Row " + str(offset + r + 1) + ": " +
+                         field.get('disp_name', name) + " (" + name + ") " +
+                         str(body[r, i]) + " is not valid")
+    return keep, error
+
+
+def header_row(url, sheet=DATA_SHEET):
+    '''
+    The number in the sheet of the header row, the row with eventID
+
+    Parameters
+    ----------
+    url : str
+        Path to the sample log
+
+    sheet : str, optional
+        The name of the data sheet
+        Default: DATA_SHEET
+
+    Returns
+    ----------
+    row : int or None
+        None if there is no header
+    '''
+    wb = openpyxl.load_workbook(url, read_only=True, data_only=True)
+    try:
+        for number, row in enumerate(wb[sheet].iter_rows(values_only=True), start=1):
+            if COLUMNS[0] in row:
+                return number
+    finally:
+        wb.close()
+    return None
+
+
+def error_rows(error):
+    '''
+    The rows the errors are in. A line without a row number followed by
+    lines with row numbers is the heading of these, like the field name
+    px.run writes before the rows with errors in that field.
+
+    Parameters
+    ----------
+    error : list of str
+        The errors of px.run or check_batch
+
+    Returns
+    ----------
+    rows : set of int
+        The row numbers given in the errors
+
+    general : list of str
+        The errors not about single rows
+    '''
+    rows = set()
+    general = []
+    numbers = [ERROR_ROW.search(line) for line in error]
+    for i, (line, number) in enumerate(zip(error, numbers)):
+        if number is not None:
+            rows.add(int(number.group(1)))
+        elif i + 1 == len(error) or numbers[i + 1] is None:
+            general.append(line)
+    return rows, general
+
+
+def stream_insert_db(cur, url, filename, batch_size, update=False, reason=''):
+    '''
+    Streams the data sheet in batches and inserts every batch with
+    bulk_insert_db. Peak memory is bounded by the batch size instead of
+    the size of the workbook.
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+
+    url : str
+        Path to the sample log
+
+    filename : str
+        The source filename
+
+    batch_size : int
+        The number of rows in each batch
+
+    update : Boolean, optional
+        Determines if existing eventIDs are updated.
+        Default: False
+
+    reason : str, optional
+        Reason for update, asked for once if empty
+        Default: ''
+
+    Returns
+    ----------
+    rows : int
+        The number of data rows read
+
+    error : list of str
+        The errors found, rows with errors are not inserted
+
+    inserted : int
+        The number of inserted rows
+
+    updated : int
+        The number of updated rows
+    '''
+    metadata = read_metadata(url)
+    if update and reason == '':
+        print("What is the reason for the update of " + filename +
+              " (is appended to the history):")
+        reason = input()
+
+    rows = 0
+    inserted = 0
+    updated = 0
+    error = []
+    for data in iter_batches(url, batch_size):
+        keep, batch_error = check_batch(data, rows, metadata)
+        for line in batch_error:
+            print(line)
+        error = error + batch_error
+        rows = rows + data.shape[0] - 1
+        n, summary = bulk_insert_db(cur, data[keep], metadata, filename,
+                                    update, reason)
+        inserted = inserted + n
+        updated = updated + len(summary)
+    return rows, error, inserted, updated
+
+
+def read_batch_manifest(path):
+    '''
+    Reads the manifest for a non-interactive batch ingest.
+    The manifest is a csv file with the columns source, reason and on_error.
+    A row with source * gives the defaults for files not listed.
+
+    Parameters
+    ----------
+    path : str
+        Path to the manifest csv file
+
+    Returns
+    ----------
+    policies : dict
+        The reason and error policy for every source filename
+    '''
+    manifest = pd.read_csv(path, dtype=str, keep_default_na=False)
+    policies = {}
+    for idx, row in manifest.iterrows():
+        on_error = row.get('on_error', '').strip() or 'skip'
+        if on_error not in ERROR_POLICIES:
+            raise ValueError("Unknown error policy " + on_error + " for " +
+                             row['source'] + ", use one of " + ", ".join(ERROR_POLICIES))
+        policies[row['source'].strip()] = (row.get('reason', '').strip(), on_error)
+    return policies
+
+
+def file_policy(policies, filename, reason=''):
+    '''
+    Finds the update reason and error policy of a file in the batch manifest
+
+    Parameters
+    ----------
+    policies : dict
+        The policies from read_batch_manifest
+
+    filename : str
+        The source filename
+
+    reason : str, optional
+        The reason to use if none is given in the manifest
+        Default: ''
+
+    Returns
+    ----------
+    reason : str
+        The reason for updates, never empty so nobody is asked
+
+    on_error : str
+        One of ERROR_POLICIES
+    '''
+    file_reason, on_error = policies.get(
+        filename, policies.get('*', ('', 'skip')))
+    reason = file_reason or reason or "Update from " + filename
+    return reason, on_error
+
+
+def write_report(path, report):
+    '''
+    Writes the machine readable report of a batch ingest
+
+    Parameters
+    ----------
+    path : str
+        Path to the json file
+
+    report : list of dict
+        One entry per file with the source, status, rows, inserted,
+        updated and errors
+    '''
+    with open(path, 'w') as fid:
+        json.dump({'finished': get_time_now(), 'files': report}, fid, indent=1)
+    print("Report written to", path)
+
+
+def file_hash(url):
+    '''
+    Calculates the content hash of a file
+
+    Parameters
+    ----------
+    url : str
+        Path to the file
+
+    Returns
+    ----------
+    digest : str
+        The sha256 hex digest of the file content
+    '''
+    sha = hashlib.sha256()
+    with open(url, 'rb') as fid:
+        for chunk in iter(lambda: fid.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def create_manifest(cur):
+    '''
+    Creates the ingest manifest table if it does not exist
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+    '''
+    cur.execute(sql.SQL('''
+    CREATE TABLE IF NOT EXISTS {} (hash text PRIMARY KEY,
+                                   source text,
+                                   ingested timestamp with time zone,
+                                   rows integer,
+                                   good boolean,
+                                   errors text)''').format(sql.Identifier(MANIFEST)))
+
+
+def in_manifest(cur, hashes):
+    '''
+    Finds which of the content hashes have already been ingested
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+
+    hashes : list of str
+        The content hashes to look for
+
+    Returns
+    ----------
+    found : set of str
+        The hashes found in the manifest
+    '''
+    cur.execute(sql.SQL("SELECT hash FROM {} WHERE hash = ANY(%s)").format(
+        sql.Identifier(MANIFEST)), (hashes,))
+    return set(r[0] for r in cur.fetchall())
+
+
+def write_manifest(cur, digest, filename, rows, good, error):
+    '''
+    Records an ingested file in the manifest
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+
+    digest : str
+        The content hash of the file
+
+    filename : str
+        The source filename
+
+    rows : int
+        The number of data rows in the file
+
+    good : Boolean
+        The validation result
+
+    error : list of str
+        The validation errors
+    '''
+    cur.execute(sql.SQL('''
+    INSERT INTO {} (hash, source, ingested, rows, good, errors)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (hash) DO UPDATE SET source = EXCLUDED.source,
+                                     ingested = EXCLUDED.ingested,
+                                     rows = EXCLUDED.rows,
+                                     good = EXCLUDED.good,
+                                     errors = EXCLUDED.errors''').format(
+        sql.Identifier(MANIFEST)),
+        (digest, filename, get_time_now(), rows, good, "\n".join(error)))
+
+
+def create_checkpoint(cur):
+    '''
+    Creates the checkpoint table if it does not exist
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+    '''
+    cur.execute(sql.SQL('''
+    CREATE TABLE IF NOT EXISTS {} (run text,
+                                   source text,
+                                   hash text,
+                                   status text,
+                                   committed timestamp with time zone,
+                                   PRIMARY KEY (run, source))''').format(
+        sql.Identifier(CHECKPOINT)))
+
+
+def read_checkpoint(cur, run):
+    '''
+    Finds the files completed by a run
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+
+    run : str
+        The absolute path of the input file or folder
+
+    Returns
+    ----------
+    completed : set of str
+        The source filenames completed
+    '''
+    cur.execute(sql.SQL("SELECT source FROM {} WHERE run = %s").format(
+        sql.Identifier(CHECKPOINT)), (run,))
+    return set(r[0] for r in cur.fetchall())
+
+
+def clear_checkpoint(cur, run):
+    '''
+    Removes the checkpoints of a run, used when starting it from the beginning
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+
+    run : str
+        The absolute path of the input file or folder
+    '''
+    cur.execute(sql.SQL("DELETE FROM {} WHERE run = %s").format(
+        sql.Identifier(CHECKPOINT)), (run,))
+
+
+def write_checkpoint(cur, run, filename, digest, status):
+    '''
+    Records an ingested file. Written in the same transaction as the file,
+    so it is only there if the file is committed.
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+
+    run : str
+        The absolute path of the input file or folder
+
+    filename : str
+        The source filename
+
+    digest : str
+        The content hash of the file
+
+    status : str
+        What happened to the file, ingested
+    '''
+    cur.execute(sql.SQL('''
+    INSERT INTO {} (run, source, hash, status, committed)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (run, source) DO UPDATE SET hash = EXCLUDED.hash,
+                                            status = EXCLUDED.status,
+                                            committed = EXCLUDED.committed''').format(
+        sql.Identifier(CHECKPOINT)), (run, filename, digest, status, get_time_now()))
+
+
+def ingest_file(cur, args, url, good, error, data, metadata, reason='', on_error=None):
+    '''
+    Ingests one file, does not commit
+
+    Parameters
+    ----------
+    cur : psycopg2 cursor
+        Database cursor
+
+    args : argparse.Namespace
+        The command line options
+
+    url : str
+        Path to the sample log
+
+    good, error, data, metadata :
+        The output of parse_file, not used when streaming
+
+    reason : str, optional
+        Reason for update
+        Default: ''
+
+    on_error : str, optional
+        One of ERROR_POLICIES, None asks what to do
+        Default: None
+
+    Returns
+    ----------
+    entry : dict
+        The report entry with the source, status (ingested, skipped or
+        aborted), rows, inserted, updated and errors
+    '''
+    filename = os.path.basename(url)
+    entry = {'source': filename, 'status': 'ingested',
+             'rows': 0, 'inserted': 0, 'updated': 0}
+
+    if args.stream:
+        cur.execute("SAVEPOINT ingest_file")
+        rows, error, inserted, updated = stream_insert_db(
+            cur, url, filename, args.stream, args.update, reason)
+        if error:
+            entry['errors'] = error
+            if on_error is None:
+                print("Rows with errors were left out. Should we continue? [y/n]")
+                if input().lower() != 'y':
+                    on_error = 'skip'
+            if on_error in ('skip', 'abort'):
+                cur.execute("ROLLBACK TO SAVEPOINT ingest_file")
+                entry['status'] = 'skipped' if on_error == 'skip' else 'aborted'
+                return entry
+        cur.execute("RELEASE SAVEPOINT ingest_file")
+    else:
+        if not(good):
+            print("Errors found")
+            for line in error:
+                print(line)
+            entry['errors'] = list(error)
+            if on_error is None:
+                print("Should we continue? [y/n]")
+                answer = input().lower()
+                if answer != 'y':
+                    entry['status'] = 'skipped'
+                    return entry
+            elif on_error == 'skip':
+                entry['status'] = 'skipped'
+                return entry
+            elif on_error == 'abort':
+                entry['status'] = 'aborted'
+                return entry
+            else:
+                # The rows with errors are found again with the field
+                # definitions, the file is only ingested if these are all
+                # the rows px.run reported
+                keep, row_error = check_batch(data, metadata=metadata)
+                rows, general = error_rows(error)
+                if is_xlsx(url):
+                    # px.run numbers the rows as in the sheet
+                    first = header_row(url)
+                    rows = {r - first for r in rows} if first is not None else {-1}
+                dropped = set(np.where(~keep)[0])
+                if general or not rows or not rows <= dropped:
+                    print("The errors are not all in rows that can be left out, skipping",
+                          filename)
+                    entry['status'] = 'skipped'
+                    return entry
+                entry['errors'] = entry['errors'] + row_error
+                data = data[keep]
+        rows = data.shape[0] - 1
+        if args.bulk:
+            inserted, updated = bulk_insert_db(
+                cur, data, metadata, filename, args.update, reason)
+            updated = len(updated)
+        else:
+            inserted, updated = insert_db(
+                cur, data, metadata, filename, args.update, reason)
+    print("Inserted", inserted, "rows, updated", updated, "rows")
+    entry.update({'rows': rows, 'inserted': inserted, 'updated': updated})
+    return entry
+
+
+def parse_file(url):
+    '''
+    Parses and validates one file. Used by the process pool when running
+    with several jobs, so it only works on the file and not the database.
+
+    Parameters
+    ----------
+    url : str
+        Path to the sample log
+
+    Returns
+    ----------
+    url : str
+        Path to the sample log
+
+    good : Boolean
+        True if no errors were found
+
+    error : list of str
+        The errors found
+
+    data : data array
+        The data with header for every column
+
+    metadata : array
+        The metadata from the metadata sheet
+    '''
+    if is_xlsx(url):
+        good, error, data, metadata = px.run(url, return_data=True)
+    else:
+        # Machine generated logs skip the spreadsheet parse, the rows are checked
+        # against the field definitions
+        data = table_to_array(read_table(url))
+        metadata = read_metadata(url)
+        keep, error = check_batch(data, metadata=metadata)
+        good = not(error)
+    return url, good, error, data, metadata
+
+
+def main(argv=None):  # IGNORE:C0111
+    '''Command line options.'''
+    try:
+        args = parse_options()
+        files = args.input
+        # Connect to the database as the user running the script
+        conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+        psycopg2.extras.register_uuid()
+        psycopg2.extras.register_hstore(conn)
+
+        cur = conn.cursor()
+
+        if os.path.isfile(files):
+            urls = []
+            urls.append(files)
+        else:
+            urls = []
+            for ext in SAMPLE_LOGS:
+                urls = urls + glob.glob(os.path.join(files, '*' + ext))
+            # The manifest and report of a batch run are no sample logs
+            own = set(os.path.abspath(f) for f in [args.batch, args.report] if f)
+            urls = sorted(url for url in urls if not url.endswith(METADATA_SUFFIX)
+                          and os.path.abspath(url) not in own)
+
+        policies = None
+        if args.batch:
+            policies = read_batch_manifest(args.batch)
+        report = []
+
+        # Files completed by an earlier, interrupted run are skipped
+        run = os.path.abspath(files)
+        create_checkpoint(cur)
+        if args.resume:
+            completed = read_checkpoint(cur, run)
+            for url in urls:
+                if os.path.basename(url) in completed:
+                    print("Skipping completed file", url)
+            urls = [url for url in urls if os.path.basename(url) not in completed]
+        else:
+            clear_checkpoint(cur, run)
+
+        # Byte identical files that are already ingested are skipped
+        create_manifest(cur)
+        hashes = {url: file_hash(url) for url in urls}
+        if not args.force:
+            done = in_manifest(cur, list(hashes.values()))
+            for url in urls:
+                if hashes[url] in done:
+                    print("Skipping unchanged file", url)
+                    report.append({'source': os.path.basename(url),
+                                   'status': 'unchanged'})
+            urls = [url for url in urls if hashes[url] not in done]
+
+        conn.commit()
+
+        if args.stream:
+            # Files are read and inserted in batches, nothing is parsed up front
+            pool = None
+            parsed = ((url, True, [], None, None) for url in urls)
+        elif args.jobs > 1:
+            # Parse in a pool, imap gives the results back in file order
+            pool = multiprocessing.Pool(args.jobs)
+            parsed = pool.imap(parse_file, urls)
+        else:
+            pool = None
+            parsed = map(parse_file, urls)
+
+        status = 0
+        try:
+            for url, good, error, data, metadata in parsed:
+                print("Url", url)
+                filename = os.path.basename(url)
+                reason = args.mod
+                on_error = None  # Ask
+                if policies is not None:
+                    reason, on_error = file_policy(policies, filename, args.mod)
+
+                # Every file is its own transaction, a failure only rolls back this file
+                try:
+                    entry = ingest_file(cur, args, url, good, error, data, metadata,
+                                        reason, on_error)
+                    report.append(entry)
+                    if entry['status'] == 'aborted':
+                        conn.rollback()
+                        status = 1
+                        break
+                    if entry['status'] == 'ingested':
+                        # Skipped files are tried again by --resume, they might be fixed
+                        write_manifest(cur, hashes[url], filename, entry['rows'],
+                                       not(entry.get('errors')), entry.get('errors', []))
+                        write_checkpoint(cur, run, filename, hashes[url], entry['status'])
+                    conn.commit()
+                except Exception as e:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error as cleanup:
+                        # The connection is lost, the transaction is gone with it
+                        print("Rollback failed:", cleanup)
+                    print("Failed, rolled back", filename)
+                    print(e)
+                    report.append({'source': filename, 'status': 'failed',
+                                   'errors': [str(e).strip()]})
+                    if not isinstance(e, psycopg2.Error):
+                        raise RuntimeError("Ingest of " + filename + " failed, the files before it "
+                                           "are committed. Continue with --resume") from e
+                    status = 1
+                    break
+        finally:
+            # Also stops the workers and reports on other errors and interrupts
+            if pool is not None:
+                pool.terminate()
+            if args.report:
+                write_report(args.report, report)
+
+        if status != 0:
+            print("Stopped, the files before", filename,
+                  "are committed. Continue with --resume")
+            cur.close()
+            conn.close()
+            return status
 
-        conn.commit()
         cur.close()
         conn.close()
         return 0
@@ -399,7 +1846,7 @@ def parse_options():
                             formatter_class=RawDescriptionHelpFormatter)
 
     parser.add_argument(
-        'input', type=str, help='''The input file or folder with the xlsx files''')
+        'input', type=str, help='''The input file or folder with the xlsx, csv, tsv or parquet files''')
     # parser.add_argument("-v", "--verbose", dest="verbose", action="count", default=0,
     #                     help="set verbosity level [default: %(default)s]")
     parser.add_argument('-V', '--version', action='version',
@@ -408,9 +1855,25 @@ def parse_options():
                         help="Update entries. If enabled existing entries will be updated, [default: %(default)s]")
     parser.add_argument('-m', dest='mod', default='', type=str,
                         help="Set the modification message if updating. [Default: %(default)s]")
+    parser.add_argument('-f', dest='force', default=False, action="store_true",
+                        help="Process all files, also those already in the ingest manifest, [default: %(default)s]")
+    parser.add_argument('-j', '--jobs', dest='jobs', default=1, type=int,
+                        help="Number of processes parsing and validating files in parallel, [default: %(default)s]")
+    parser.add_argument('--resume', dest='resume', default=False, action="store_true",
+                        help="Continue an interrupted run on the same input, skipping the files it ingested, [default: %(default)s]")
+    parser.add_argument('--batch', dest='batch', default='', type=str,
+                        help="Run without questions. Csv file with the columns source, reason and on_error (skip, abort or ingest-valid), source * sets the defaults")
+    parser.add_argument('--report', dest='report', default='', type=str,
+                        help="Write a json report of the ingest to this file. [Default: ingest_report.json with --batch]")
+    parser.add_argument('-s', '--stream', dest='stream', default=0, type=int,
+                        help="Stream the data sheet in batches of this many rows through the bulk ingest. 0 reads whole files, [default: %(default)s]")
+    parser.add_argument('-b', dest='bulk', default=False, action="store_true",
+                        help="Bulk ingest. Each file is copied into a staging table and inserted with one statement, [default: %(default)s]")
 
     # Process arguments
     args = parser.parse_args()
+    if args.batch and not args.report:
+        args.report = 'ingest_report.json'
 
     # if args.verbose > 0:
     #     print("Verbose mode on")
@@ -11,6 +11,7 @@ import psycopg2
 import psycopg2.extras
 import getpass
 import sys
+import reference_data as rd
 
 def add_new_column(cur, columnName):
     '''
@@ -69,15 +70,19 @@ def populate_cruise_names(cur, cruises):
     
     '''
 
-    for idx, row in cruises.iterrows():
-        cruiseName = row['cruiseName']
-        cruiseNumber = row['cruiseNumber']
-
-        cur.execute(f'''
+    # cruiseName is quoted in cruises.csv, some close with a typographic quote
+    values = [(int(row['cruiseNumber']), str(row['cruiseName']).strip("'’"))
+              for idx, row in cruises.dropna(subset=['cruiseNumber']).iterrows()]
+    if not values:
+        return
+    psycopg2.extras.execute_values(cur, '''
                     UPDATE aen
-                    SET cruiseName = {cruiseName}
-                    WHERE cruiseNumber = {cruiseNumber}
-                    ''')
+                    SET cruiseName = v.cruiseName
+                    FROM (VALUES %s) AS v (cruiseNumber, cruiseName)
+                    WHERE aen.cruiseNumber = v.cruiseNumber
+                    AND aen.cruiseName IS DISTINCT FROM v.cruiseName
+                    ''', values, page_size=len(values))
+    print(f'Cruise names updated on {cur.rowcount} rows')
 
 def populate_unique_stations(cur, definedStations, dbStations):
     '''
@@ -99,53 +104,54 @@ def populate_unique_stations(cur, definedStations, dbStations):
     
     '''
     
-    prevname = '' # Created so only executes PSQL query for predefined stations once, even though they appear multiple times in table
-    
+    # Predefined stations are the same on every cruise, written with a NULL cruise name
+    values = {}
     for idx, row in dbStations.iterrows():
         stationName = row['stationName']
         cruiseName = row['cruiseName']
         if stationName in list(definedStations['stationName']):
-            if stationName != prevname:
-                print(f'{stationName} to be added')
-                cur.execute(f'''
-                        UPDATE aen
-                        SET uniqueStation = '{stationName}'
-                        WHERE stationName = '{stationName}'
-                        ''')
-                prevname = stationName 
+            values[(stationName, None)] = stationName
         else:
-            uniqueStation = f'{stationName} ({cruiseName})'
-            print(f'{uniqueStation} to be added')
-            cur.execute(f'''
-                    UPDATE aen
-                    SET uniqueStation = '{uniqueStation}'
-                    WHERE stationName = '{stationName}' AND cruiseName = '{cruiseName}'
-                    ''')
-            
+            values[(stationName, cruiseName)] = f'{stationName} ({cruiseName})'
+    if not values:
+        return
+    psycopg2.extras.execute_values(cur, '''
+            UPDATE aen
+            SET uniqueStation = v.uniqueStation
+            FROM (VALUES %s) AS v (stationName, cruiseName, uniqueStation)
+            WHERE aen.stationName = v.stationName
+            AND (v.cruiseName IS NULL OR aen.cruiseName = v.cruiseName)
+            AND aen.uniqueStation IS DISTINCT FROM v.uniqueStation
+            ''', [(s, c, u) for (s, c), u in values.items()],
+            template='(%s, %s::text, %s)', page_size=len(values))
+    print(f'Unique stations updated on {cur.rowcount} rows')
+
 
 
     
 def main():
     
     print('Executing script to add cruise names and unique station names')
-    # Load pandas dataframe of cruise names and corresponding cruise numbers
-    cruises = pd.read_csv('cruises.csv')
-    
-    # Load pandas dataframe of station names with defined coordinates
-    definedStations = pd.read_csv('stations.csv')
-    del definedStations['eventID'], definedStations['sampleType'] # Removing columns not needed
-    
     # Connect to the database as the user running the script
     conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
     
+    cur = conn.cursor()
+
+    # Load pandas dataframe of cruise names and corresponding cruise numbers
+    cruises = rd.frame('cruises', cur).rename(columns={'cruisenumber': 'cruiseNumber',
+                                                       'cruisename': 'cruiseName'})
+
+    # Load pandas dataframe of station names with defined coordinates
+    definedStations = rd.frame('stations', cur).rename(columns={'stationname': 'stationName'})
+    add_new_column(cur,columnName='cruiseName')
+    populate_cruise_names(cur, cruises)
+
     # Create dataframe of unique station names from the database with their average (mean) coordinates
+    # Read after populating the cruise names, so rows that just got a cruise name are included
     query = "select concat_ws('; ', stationname, cruisename) as stationcruise, round(avg(decimallatitude)::numeric,4) as avglat, round(avg(decimallongitude)::numeric,4) as avglong from aen where stationName is not NULL and cruisename is not NULL group by stationcruise order by stationcruise;"
     dbStations = pd.read_sql(query, conn)
     dbStations[['stationName','cruiseName']] = dbStations['stationcruise'].str.split('; ',expand=True)
-    
-    cur = conn.cursor()
-    add_new_column(cur,columnName='cruiseName')
-    populate_cruise_names(cur, cruises)
+
     add_new_column(cur,columnName='uniqueStation')
     populate_unique_stations(cur, definedStations, dbStations)
     conn.commit()
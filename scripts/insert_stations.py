@@ -10,7 +10,7 @@
 '''
 
 __version__ = 0.1
-__updated__ = '2019-05-15'
+__updated__ = '2026-10-17'
 
 import getpass
 import psycopg2
@@ -21,10 +21,7 @@ import datetime as dt
 import glob
 import pandas as pd
 from collections import OrderedDict
-
-# Connect to the database as the user running the script
-conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
-cur = conn.cursor()
+import reference_data as rd
 
 
 COLUMNS = {"eventID": "uuid",
@@ -33,8 +30,7 @@ COLUMNS = {"eventID": "uuid",
            "decimalLongitude": "double precision",
            "sampleType": "text"}
 
-file_name = "stations.csv"
-stations = pd.read_csv(file_name)
+file_name = rd.SOURCES['stations']['file']
 
 
 def insert_db(cur, data):
@@ -71,8 +67,20 @@ def insert_db(cur, data):
             continue
 
 
-insert_db(cur, stations)
+def main():
+    # Connect to the database as the user running the script
+    conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+    cur = conn.cursor()
+    # The stations in ref_stations, or stations.csv if it has not been synced
+    stations = rd.frame('stations', cur).rename(
+        columns={name.lower(): name for name in COLUMNS})
+    insert_db(cur, stations)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
 
-conn.commit()
-cur.close()
-conn.close()
@@ -0,0 +1,170 @@
+#! /usr/bin/env python3
+# encoding: utf-8
+'''
+ -- Brings the database schema up to the newest version
+
+
+@deffield    updated: Updated
+'''
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+import psycopg2
+import psycopg2.extras
+from psycopg2 import sql
+import getpass
+import sys
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import init_db
+
+# Table with the applied migrations
+MIGRATIONS_TABLE = "schema_migrations"
+
+
+def create_aen(cur):
+    '''
+    The table from init_db, left as it is in existing databases
+    '''
+    cur.execute("SELECT to_regclass('aen') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        init_db.create_table(cur)
+
+
+# Version, description and the SQL or function doing the migration. Only
+# add new migrations at the end, applied migrations are never run again.
+MIGRATIONS = [
+    (1, "aen table", create_aen),
+    (2, "btree indexes on the filtered columns", '''
+    CREATE INDEX IF NOT EXISTS aen_parenteventid_idx ON aen (parenteventid);
+    CREATE INDEX IF NOT EXISTS aen_cruisenumber_idx ON aen (cruisenumber);
+    CREATE INDEX IF NOT EXISTS aen_stationname_idx ON aen (stationname);
+    CREATE INDEX IF NOT EXISTS aen_geartype_idx ON aen (geartype);
+    '''),
+    (3, "GIN indexes on the hstore columns", '''
+    CREATE INDEX IF NOT EXISTS aen_other_gin ON aen USING gin (other);
+    CREATE INDEX IF NOT EXISTS aen_metadata_gin ON aen USING gin (metadata);
+    '''),
+    (4, "trigram indexes for LIKE", '''
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS aen_stationname_trgm ON aen USING gin (stationname gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS aen_geartype_trgm ON aen USING gin (geartype gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS aen_sampletype_trgm ON aen USING gin (sampletype gin_trgm_ops);
+    '''),
+]
+
+
+def applied(cur):
+    '''
+    The applied migrations, creates the table keeping them if needed
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    Returns
+    ----------
+    versions: set of int
+    '''
+    table = sql.Identifier(MIGRATIONS_TABLE)
+    cur.execute(sql.SQL('''CREATE TABLE IF NOT EXISTS {} (version integer PRIMARY KEY,
+                                                          description text,
+                                                          applied timestamp with time zone DEFAULT now())''').format(table))
+    cur.execute(sql.SQL("SELECT version FROM {}").format(table))
+    return {r[0] for r in cur.fetchall()}
+
+
+def migrate(cur, target=None):
+    '''
+    Applies the migrations not applied yet, in order
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    target: int, optional
+        Stop after this version, None for all
+        Default: None
+
+    Returns
+    ----------
+    versions: list of int
+        The migrations applied now
+    '''
+    done = applied(cur)
+    versions = []
+    for version, description, migration in MIGRATIONS:
+        if version in done:
+            continue
+        if target is not None and version > target:
+            break
+        if callable(migration):
+            migration(cur)
+        else:
+            cur.execute(migration)
+        cur.execute(sql.SQL("INSERT INTO {} (version, description) VALUES (%s, %s)").format(
+            sql.Identifier(MIGRATIONS_TABLE)), (version, description))
+        versions.append(version)
+    return versions
+
+
+def main():
+    '''Command line options.'''
+    args = parse_options()
+    # Connect to the database as the user running the script
+    conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+    cur = conn.cursor()
+    if args.list:
+        done = applied(cur)
+        for version, description, migration in MIGRATIONS:
+            print(version, description, "applied" if version in done else "pending")
+    else:
+        # All or nothing, a failing migration rolls back the whole run
+        for version in migrate(cur, args.target):
+            print("Applied migration", version)
+    conn.commit()
+    cur.close()
+    conn.close()
+    return 0
+
+
+def parse_options():
+    """
+    Parse the command line options and return these.
+    """
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (
+        program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+    Created on %s.
+
+    Distributed on an "AS IS" basis without warranties
+    or conditions of any kind, either express or implied.
+
+    USAGE
+''' % (program_shortdesc, str(__date__))
+
+    # Setup argument parser
+    parser = ArgumentParser(description=program_license,
+                            formatter_class=RawDescriptionHelpFormatter)
+
+    parser.add_argument('-V', '--version', action='version',
+                        version=program_version_message)
+    parser.add_argument('-l', '--list', dest='list', default=False, action="store_true",
+                        help="List the migrations and whether they are applied, [default: %(default)s]")
+    parser.add_argument('-t', '--target', dest='target', default=None, type=int,
+                        help="Only migrate up to this version, [default: newest]")
+
+    # Process arguments
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(main())
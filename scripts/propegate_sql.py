@@ -18,12 +18,17 @@ import numpy as np
 import datetime as dt
 import glob
 import getpass
+import multiprocessing
+import time
+import bulk_copy as bc
+from hierarchy import Hierarchy
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
 
 
 __all__ = []
 __version__ = 0.2
 __date__ = '2018-09-10'
-__updated__ = '2019-03-22'
+__updated__ = '2026-10-17'
 
 
 COLUMNS = ["cruiseNumber",
@@ -47,6 +52,15 @@ COLUMNS = ["cruiseNumber",
            "metadata",
            "cruiseName"]
 
+# Ways of propagating the inherited fields
+MODES = ["traverse", "cte", "memory"]
+
+# Table keeping the transaction mark of incremental propagation
+STATE = "propagation_state"
+
+# Temporary table for writing back the changed rows
+STAGING = "aen_inherit"
+
 
 def get_children(cur, eventID):
     """
@@ -166,20 +180,137 @@ def write_fields(cur, parent, children, inheritable, weak):
                     cur.execute(query3, (value, child,))
 
 
-def inherit(cur):
+def get_high_water(cur):
     """
-    Goes though database table and writes all the inherited fields to children,
-    grandchildren, .... 
+    Reads the transaction mark of the last incremental propagation and the
+    transactions it wrote with
 
     Parameters
     ----------
     cur: psycopg2 cursor
 
+    Returns
+    ----------
+    high_water: tuple or None
+        The mark and the list of own transaction IDs, None if propagation
+        has not been run with --incremental before
+    """
+    cur.execute(sql.SQL('''
+    CREATE TABLE IF NOT EXISTS {0} (name text PRIMARY KEY,
+                                    mark bigint NOT NULL,
+                                    own bigint[] NOT NULL)''').format(sql.Identifier(STATE)))
+    cur.execute(sql.SQL("SELECT mark, own FROM {} WHERE name = 'inherit'").format(
+        sql.Identifier(STATE)))
+    res = cur.fetchone()
+    if res is None:
+        return None
+    return res[0], res[1]
+
+
+def get_mark(cur):
     """
+    The oldest transaction still running when the propagation starts.
+    Everything it or a later transaction writes counts as changed next time,
+    also rows committed after this with an older modified time.
 
-    tops = get_tops(cur)
+    Parameters
+    ----------
+    cur: psycopg2 cursor
 
-    # Loop over all the possible fields.
+    Returns
+    ----------
+    mark: int
+        The transaction ID, with epoch
+    """
+    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+    return cur.fetchone()[0]
+
+
+def get_own(cur):
+    """
+    The transaction ID of the cursor's transaction, so the rows written by
+    the propagation itself are not seen as changed by the next run
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    Returns
+    ----------
+    xid: int
+        The transaction ID, with epoch
+    """
+    cur.execute("SELECT txid_current()")
+    return cur.fetchone()[0]
+
+
+def set_high_water(cur, mark, own):
+    """
+    Stores the transaction mark of this propagation
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    mark: int
+        The mark from get_mark, read before propagating
+
+    own: list of int
+        The transactions that wrote the propagated rows
+    """
+    cur.execute(sql.SQL('''
+    INSERT INTO {} (name, mark, own) VALUES ('inherit', %s, %s)
+    ON CONFLICT (name) DO UPDATE SET mark = EXCLUDED.mark, own = EXCLUDED.own''').format(
+        sql.Identifier(STATE)), (mark, own))
+
+
+def get_changed_tops(cur, since):
+    """
+    Finds the top entries of the trees with rows inserted or updated since
+    the last incremental propagation. A row is changed if its current version
+    was written by the transaction of the mark or a later one. modified can
+    not be used, it is the client's time when the row was written and not
+    when it was committed.
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    since: tuple
+        The mark and own transaction IDs from get_high_water
+
+    Returns
+    ----------
+    eventIDs: list of strings
+        list of the top entries of the changed trees
+    """
+    mark, own = since
+    # xmin has no epoch, age() compares it with the mark across wraparound
+    cur.execute('''SELECT eventid FROM aen
+                   WHERE age(xmin) <= age((%s %% 4294967296)::text::xid)
+                   AND NOT xmin::text::bigint = ANY(%s)''',
+                (mark, [x % 2**32 for x in own]))
+    changed = [str(r[0]) for r in cur.fetchall()]
+    tops = list(dict.fromkeys(Hierarchy(cur).roots(changed).values()))
+    # Trees hanging from a missing parent are not propagated by a full run either
+    cur.execute("SELECT eventid FROM aen WHERE parenteventid IS NULL AND eventid = ANY(%s::uuid[])",
+                (tops,))
+    real = set(str(r[0]) for r in cur.fetchall())
+    return [t for t in tops if t in real]
+
+
+def get_inheritable():
+    """
+    Reads the inheritable fields from the darwinsheet field definitions
+
+    Returns
+    ----------
+    inheritable: list of str
+        The fields that can be inherited to children
+
+    weak: list of str
+        The fields that can be only be inherited to children if field is empty
+    """
     inheritable = []  # ["metadata"]
     weak = []  # For holding weak inheritance
     for f in fields.fields:
@@ -187,8 +318,473 @@ def inherit(cur):
             inheritable.append(f['name'])
             if "inherit_weak" in f and f["inherit_weak"]:
                 weak.append(f['name'])
+    return inheritable, weak
+
+
+def filled_keys(other):
+    """
+    SQL for the inheritable keys of an hstore that have a value.
+    Keys with an empty or NULL value count as missing.
+
+    Parameters
+    ----------
+    other: psycopg2.sql.Composable
+        The hstore expression
+
+    Returns
+    ----------
+    query: psycopg2.sql.Composed
+        hstore expression with the filled inheritable keys
+    """
+    return sql.SQL('''(SELECT coalesce(hstore(array_agg(key), array_agg(value)), ''::hstore)
+                FROM each(slice({}, %(keys)s)) WHERE value <> '')''').format(other)
+
+
+def inherit_cte(cur, inheritable, weak, roots=None):
+    """
+    Writes the inherited fields of all the descendants of the top entries
+    with one recursive CTE and one UPDATE.
+    The inherited value is the parent's value, or the child's own value if the
+    parent has none. For weak fields the child's own value comes first.
+    Names not in COLUMNS are keys in other. They are carried down the tree
+    as an hstore with the filled keys, where the child's own values win, and
+    merged into other, so only empty keys are filled. Rows with no other
+    are left without and pass no keys on, as in write_fields.
+    Only rows where a value changes are written.
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    inheritable: list of str
+        The fields that can be inherited to children
+
+    weak: list of str
+        The fields that can be only be inherited to children if field is empty
+
+    roots: list of str, optional
+        Only propagate the trees below these top entries, None for all
+        Default: None
+
+    Returns
+    ----------
+    updated: int
+        The number of rows updated
+    """
+    keys = [col for col in inheritable if col not in COLUMNS]
+    selected = []
+    inherited = []
+    sets = []
+    changed = []
+    for col in inheritable:
+        if col not in COLUMNS:
+            continue
+        ident = sql.Identifier(col.lower())
+        selected.append(ident)
+        if col in weak:  # Only inherit if empty
+            inherited.append(sql.SQL("coalesce(c.{0}, t.{0})").format(ident))
+        else:
+            inherited.append(sql.SQL("coalesce(t.{0}, c.{0})").format(ident))
+        sets.append(sql.SQL("{0} = t.{0}").format(ident))
+        changed.append(sql.SQL("a.{0} IS DISTINCT FROM t.{0}").format(ident))
+    if keys:
+        # A NULL other stays NULL and passes nothing on, as other || value in write_fields
+        merged = sql.SQL("a.other || t.inherit_other")
+        selected.append(sql.SQL("{} AS inherit_other").format(
+            filled_keys(sql.SQL("other"))))
+        inherited.append(sql.SQL(
+            "CASE WHEN c.other IS NULL THEN ''::hstore ELSE (t.inherit_other || {})::hstore END").format(
+            filled_keys(sql.SQL("c.other"))))
+        sets.append(sql.SQL("other = {}").format(merged))
+        changed.append(sql.SQL("a.other IS DISTINCT FROM {}").format(merged))
+    if not selected:
+        return 0
+
+    query = sql.SQL('''
+    WITH RECURSIVE tree AS (
+        SELECT eventid, {selected} FROM aen WHERE {tops}
+        UNION ALL
+        SELECT c.eventid, {inherited}
+        FROM aen c JOIN tree t ON c.parenteventid = t.eventid
+    )
+    UPDATE aen a SET {sets}
+    FROM tree t
+    WHERE a.eventid = t.eventid AND a.parenteventid IS NOT NULL
+    AND ({changed})''').format(
+        selected=sql.SQL(', ').join(selected),
+        tops=sql.SQL("parenteventid IS NULL" if roots is None else
+                     "eventid = ANY(%(roots)s::uuid[])"),
+        inherited=sql.SQL(', ').join(inherited),
+        sets=sql.SQL(', ').join(sets),
+        changed=sql.SQL(' OR ').join(changed))
+    cur.execute(query, {'roots': roots, 'keys': keys})
+    return cur.rowcount
+
+
+def inherit_memory(cur, inheritable, weak, roots=None):
+    """
+    Reads the tree once, works out the inherited fields in memory and writes
+    back only the rows that change, with COPY into a staging table and one
+    UPDATE. Gives the same result as traverse_three, also for children
+    with no other, which get no inherited keys.
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    inheritable: list of str
+        The fields that can be inherited to children
+
+    weak: list of str
+        The fields that can be only be inherited to children if field is empty
+
+    roots: list of str, optional
+        Only propagate the trees below these top entries, None for all
+        Default: None
+
+    Returns
+    ----------
+    updated: int
+        The number of rows updated
+    """
+    cols = [col for col in inheritable if col in COLUMNS]
+    keys = [col for col in inheritable if col not in COLUMNS]
+    is_weak = [col in weak for col in cols]
+
+    # Server side cursor, so the rows are fetched in chunks
+    load = cur.connection.cursor(name='inherit_load')
+    load.itersize = 50000
+    select = sql.SQL('').join([sql.SQL("{}, ").format(sql.Identifier(col.lower()))
+                               for col in cols])
+    if roots is None:
+        load.execute(sql.SQL("SELECT eventid, parenteventid, {} other FROM aen").format(select))
+    else:
+        load.execute(sql.SQL('''
+        WITH RECURSIVE tree AS (
+            SELECT * FROM aen WHERE eventid = ANY(%s::uuid[])
+            UNION ALL
+            SELECT c.* FROM aen c JOIN tree t ON c.parenteventid = t.eventid
+        )
+        SELECT eventid, parenteventid, {} other FROM tree''').format(select), (roots,))
+    rows = {}
+    children = {}
+    tops = []
+    for r in load:
+        eventID = str(r[0])
+        rows[eventID] = list(r[2:])
+        if r[1] is None:
+            tops.append(eventID)
+        else:
+            children.setdefault(str(r[1]), []).append(eventID)
+    load.close()
+
+    changed = []
+    stack = tops
+    while stack:
+        parent = stack.pop()
+        p = rows[parent]
+        p_other = p[-1] or {}
+        for child in children.get(parent, []):
+            c = rows[child]
+            new = list(c)
+            for i in range(len(cols)):
+                if p[i] is None:  # Make sure we are not removing information
+                    continue
+                if is_weak[i] and c[i] is not None:  # Only inherit if empty
+                    continue
+                new[i] = p[i]
+            for key in keys:
+                if new[-1] is None:
+                    break  # other || value is NULL in write_fields, so NULL stays
+                if p_other.get(key, '') in ('', None):
+                    continue
+                if new[-1].get(key, '') not in ('', None):
+                    continue  # Something there, so we continue
+                new[-1] = dict(new[-1])
+                new[-1][key] = p_other[key]
+            if new != c:
+                rows[child] = new
+                changed.append([child] + new)
+            stack.append(child)
+
+    if not changed:
+        return 0
+    bc.create_staging(cur, STAGING)
+    bc.copy_rows(cur, STAGING, ['eventid'] + cols + ['other'], changed)
+    cur.execute(sql.SQL('''
+    UPDATE aen a SET {}
+    FROM {} s
+    WHERE a.eventid = s.eventid''').format(
+        sql.SQL(', ').join([sql.SQL("{0} = s.{0}").format(sql.Identifier(col.lower()))
+                            for col in cols + ['other']]),
+        sql.Identifier(STAGING)))
+    return cur.rowcount
+
+
+def inherit(cur, mode='traverse', roots=None):
+    """
+    Goes though database table and writes all the inherited fields to children,
+    grandchildren, .... 
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    mode: str, optional
+        traverse walks the tree one parent at the time,
+        cte writes all the fields, also the keys in other, in one statement,
+        memory reads the tree once and writes back the changed rows
+        Default: 'traverse'
+
+    roots: list of str, optional
+        Only propagate the trees below these top entries, None for all
+        Default: None
+
+    Returns
+    ----------
+    updated: int or None
+        The number of rows updated, None for traverse which does not count
+    """
+
+    if roots is None:
+        tops = get_tops(cur)
+    else:
+        tops = roots
+
+    # Loop over all the possible fields.
+    inheritable, weak = get_inheritable()
+
+    if mode == 'memory':
+        return inherit_memory(cur, inheritable, weak, roots)
+
+    if mode == 'cte':
+        return inherit_cte(cur, inheritable, weak, roots)
 
     traverse_three(cur, tops, inheritable, weak)
+    return None
+
+
+def trigger_sql(inheritable, weak):
+    """
+    SQL creating the triggers that inherit the fields as rows are written.
+    A new or re-parented row takes the fields from its parent before it is
+    written. A new row, or a row with a changed inheritable field, pushes its
+    fields to its children, whose update pushes on to their children, so a
+    change cascades down the subtree. The parent value wins, except for weak
+    fields, and keys in other are only filled where the child has no value,
+    as in inherit_cte.
+
+    Parameters
+    ----------
+    inheritable: list of str
+        The fields that can be inherited to children
+
+    weak: list of str
+        The fields that can be only be inherited to children if field is empty
+
+    Returns
+    ----------
+    query: psycopg2.sql.Composed
+        Creates the functions and triggers, needs the parameter keys with
+        the inheritable keys in other
+    """
+    keys = [col for col in inheritable if col not in COLUMNS]
+    pull = []
+    push = []
+    changed = []
+    touched = []
+    for col in inheritable:
+        if col not in COLUMNS:
+            continue
+        ident = sql.Identifier(col.lower())
+        if col in weak:  # Only inherit if empty
+            pull.append(sql.SQL("NEW.{0} := coalesce(NEW.{0}, p.{0});").format(ident))
+            value = sql.SQL("coalesce(c.{0}, NEW.{0})").format(ident)
+        else:
+            pull.append(sql.SQL("NEW.{0} := coalesce(p.{0}, NEW.{0});").format(ident))
+            value = sql.SQL("coalesce(NEW.{0}, c.{0})").format(ident)
+        push.append(sql.SQL("{} = {}").format(ident, value))
+        changed.append(sql.SQL("c.{} IS DISTINCT FROM {}").format(ident, value))
+        touched.append(sql.SQL("OLD.{0} IS DISTINCT FROM NEW.{0}").format(ident))
+    if keys:
+        # A NULL other stays NULL, as in write_fields
+        pull.append(sql.SQL('''IF NEW.other IS NOT NULL AND aen_inherit_filled(p.other) <> ''::hstore THEN
+        NEW.other := NEW.other ||
+                     (aen_inherit_filled(p.other) || aen_inherit_filled(NEW.other));
+    END IF;'''))
+        value = sql.SQL('''CASE WHEN c.other IS NULL OR aen_inherit_filled(NEW.other) = ''::hstore THEN c.other
+        ELSE c.other || (aen_inherit_filled(NEW.other) || aen_inherit_filled(c.other)) END''')
+        push.append(sql.SQL("other = {}").format(value))
+        changed.append(sql.SQL("c.other IS DISTINCT FROM {}").format(value))
+        touched.append(sql.SQL("OLD.other IS DISTINCT FROM NEW.other"))
+
+    return sql.SQL('''
+    CREATE OR REPLACE FUNCTION aen_inherit_filled(h hstore) RETURNS hstore AS $$
+        SELECT {filled}
+    $$ LANGUAGE sql IMMUTABLE;
+
+    CREATE OR REPLACE FUNCTION aen_inherit_pull() RETURNS trigger AS $$
+    DECLARE
+        p aen%%ROWTYPE;
+    BEGIN
+        SELECT * INTO p FROM aen
+        WHERE eventid = NEW.parenteventid AND eventid <> NEW.eventid;
+        IF FOUND THEN
+            {pull}
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION aen_inherit_push() RETURNS trigger AS $$
+    BEGIN
+        UPDATE aen c SET {push}
+        WHERE c.parenteventid = NEW.eventid AND c.eventid <> NEW.eventid
+        AND ({changed});
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS aen_inherit_pull ON aen;
+    DROP TRIGGER IF EXISTS aen_inherit_pull_insert ON aen;
+    CREATE TRIGGER aen_inherit_pull_insert BEFORE INSERT ON aen
+        FOR EACH ROW WHEN (NEW.parenteventid IS NOT NULL)
+        EXECUTE PROCEDURE aen_inherit_pull();
+    -- Only a new parent, updates setting the same parent leave the row alone
+    DROP TRIGGER IF EXISTS aen_inherit_pull_update ON aen;
+    CREATE TRIGGER aen_inherit_pull_update BEFORE UPDATE OF parenteventid ON aen
+        FOR EACH ROW WHEN (NEW.parenteventid IS NOT NULL
+                           AND OLD.parenteventid IS DISTINCT FROM NEW.parenteventid)
+        EXECUTE PROCEDURE aen_inherit_pull();
+    DROP TRIGGER IF EXISTS aen_inherit_push_insert ON aen;
+    CREATE TRIGGER aen_inherit_push_insert AFTER INSERT ON aen
+        FOR EACH ROW EXECUTE PROCEDURE aen_inherit_push();
+    DROP TRIGGER IF EXISTS aen_inherit_push_update ON aen;
+    CREATE TRIGGER aen_inherit_push_update AFTER UPDATE ON aen
+        FOR EACH ROW WHEN ({touched})
+        EXECUTE PROCEDURE aen_inherit_push();
+    ''').format(filled=filled_keys(sql.SQL("h")),
+                pull=sql.SQL('\n            ').join(pull),
+                push=sql.SQL(', ').join(push),
+                changed=sql.SQL(' OR ').join(changed),
+                touched=sql.SQL(' OR ').join(touched))
+
+
+def install_triggers(cur):
+    """
+    Propagates the whole table once so the existing rows are up to date,
+    and installs the triggers inheriting the fields as rows are written.
+    Afterwards the batch propagation is no longer needed.
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    Returns
+    ----------
+    updated: int
+        The number of rows updated by the initial propagation
+    """
+    inheritable, weak = get_inheritable()
+    keys = [col for col in inheritable if col not in COLUMNS]
+    # The children of every written row are looked up by the triggers
+    cur.execute("CREATE INDEX IF NOT EXISTS aen_parenteventid_idx ON aen (parenteventid)")
+    # Propagated before the triggers are there, so its updates do not fire them
+    updated = inherit_cte(cur, inheritable, weak)
+    cur.execute(trigger_sql(inheritable, weak), {'keys': keys})
+    return updated
+
+
+def uninstall_triggers(cur):
+    """
+    Removes the inheritance triggers, back to batch propagation
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+    """
+    cur.execute('''
+    DROP TRIGGER IF EXISTS aen_inherit_pull ON aen;
+    DROP TRIGGER IF EXISTS aen_inherit_pull_insert ON aen;
+    DROP TRIGGER IF EXISTS aen_inherit_pull_update ON aen;
+    DROP TRIGGER IF EXISTS aen_inherit_push_insert ON aen;
+    DROP TRIGGER IF EXISTS aen_inherit_push_update ON aen;
+    DROP FUNCTION IF EXISTS aen_inherit_pull();
+    DROP FUNCTION IF EXISTS aen_inherit_push();
+    DROP FUNCTION IF EXISTS aen_inherit_filled(hstore);''')
+
+
+def get_partitions(cur, jobs, roots=None):
+    """
+    Splits the top entries into partitions of whole cruises, of about the
+    same number of top entries, for propagating them in parallel
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    jobs: int
+        The number of partitions
+
+    roots: list of str, optional
+        Only split these top entries, None for all
+        Default: None
+
+    Returns
+    ----------
+    partitions: list of lists of str
+        The top entries of every partition, empty partitions are left out
+    """
+    if roots is None:
+        cur.execute("SELECT eventid, cruisenumber FROM aen WHERE parenteventid IS NULL")
+    else:
+        cur.execute('''SELECT eventid, cruisenumber FROM aen
+                       WHERE parenteventid IS NULL AND eventid = ANY(%s::uuid[])''', (roots,))
+    cruises = {}
+    for r in cur.fetchall():
+        cruises.setdefault(r[1], []).append(str(r[0]))
+
+    # Largest cruises first, each to the smallest partition so far
+    partitions = [[] for i in range(jobs)]
+    for tops in sorted(cruises.values(), key=len, reverse=True):
+        min(partitions, key=len).extend(tops)
+    return [p for p in partitions if p]
+
+
+def propagate_partition(task):
+    """
+    Propagates one partition on its own connection and in its own transaction.
+    Used by the process pool.
+
+    Parameters
+    ----------
+    task: tuple
+        The mode and the list of top entries of the partition
+
+    Returns
+    ----------
+    result: dict
+        The number of top entries, rows updated, seconds used, the
+        transaction ID and the error if the partition was rolled back
+    """
+    mode, roots = task
+    start = time.time()
+    conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+    psycopg2.extras.register_hstore(conn)  # Make sure that hstore goes to dict
+    cur = conn.cursor()
+    result = {'tops': len(roots), 'updated': None, 'error': '', 'xid': None}
+    try:
+        result['updated'] = inherit(cur, mode, roots)
+        result['xid'] = get_own(cur)
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        result['error'] = str(e).strip()
+    finally:
+        cur.close()
+        conn.close()
+    result['seconds'] = round(time.time() - start, 1)
+    return result
 
 
 def traverse_three(cur, tops, inheritable, weak):
@@ -220,16 +816,100 @@ def traverse_three(cur, tops, inheritable, weak):
 
 
 def main():
+    args = parse_options()
     # Connect to the database as the user running the script
     conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
     psycopg2.extras.register_hstore(conn)  # Make sure that hstore goes to dict
     cur = conn.cursor()
-    inherit(cur)
+    if args.triggers != '':
+        if args.triggers == 'install':
+            print("Inheritance triggers installed, updated",
+                  install_triggers(cur), "rows")
+        else:
+            uninstall_triggers(cur)
+            print("Inheritance triggers removed")
+        conn.commit()
+        cur.close()
+        conn.close()
+        return 0
+    roots = None
+    if args.incremental:
+        mark = get_mark(cur)
+        since = get_high_water(cur)
+        if since is not None:
+            roots = get_changed_tops(cur, since)
+            print("Propagating", len(roots), "trees changed since transaction", since[0])
+    if args.jobs > 1:
+        partitions = get_partitions(cur, args.jobs, roots)
+        with multiprocessing.Pool(args.jobs) as pool:
+            results = pool.map(propagate_partition,
+                               [(args.mode, p) for p in partitions])
+        failed = False
+        for i, result in enumerate(results):
+            print("Partition", i, result)
+            failed = failed or result['error'] != ''
+        if args.mode != 'traverse':
+            print("Updated", sum([r['updated'] or 0 for r in results]), "rows in",
+                  len(results), "partitions")
+        if failed:
+            # Do not move the high water mark past the failed trees
+            print("Some partitions failed and were rolled back")
+            cur.close()
+            conn.close()
+            return 1
+        own = [r['xid'] for r in results]
+    else:
+        updated = inherit(cur, args.mode, roots)
+        if updated is not None:
+            print("Updated", updated, "rows")
+        own = []
+    if args.incremental:
+        set_high_water(cur, mark, own + [get_own(cur)])
 
     conn.commit()
     cur.close()
     conn.close()
 
 
+def parse_options():
+    """
+    Parse the command line options and return these.
+    """
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (
+        program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+    Created by Pål Ellingsen on %s.
+
+    Distributed on an "AS IS" basis without warranties
+    or conditions of any kind, either express or implied.
+
+    USAGE
+''' % (program_shortdesc, str(__date__))
+
+    # Setup argument parser
+    parser = ArgumentParser(description=program_license,
+                            formatter_class=RawDescriptionHelpFormatter)
+
+    parser.add_argument('-V', '--version', action='version',
+                        version=program_version_message)
+    parser.add_argument('-m', '--mode', dest='mode', default='traverse', choices=MODES,
+                        help="How to propagate. traverse walks the tree one parent at the time, cte uses one recursive query for all columns, memory reads the tree once and writes back the changed rows, [default: %(default)s]")
+    parser.add_argument('-j', '--jobs', dest='jobs', default=1, type=int,
+                        help="Propagate the trees in this many partitions of whole cruises in parallel, each on its own connection, [default: %(default)s]")
+    parser.add_argument('-i', '--incremental', dest='incremental', default=False, action="store_true",
+                        help="Only propagate the trees with rows modified since the last incremental run. The first run propagates everything, [default: %(default)s]")
+    parser.add_argument('-t', '--triggers', dest='triggers', default='', choices=['install', 'uninstall'],
+                        help="Install triggers inheriting the fields as rows are inserted or changed, after propagating everything once, or uninstall them. With the triggers installed the batch propagation is not needed")
+
+    # Process arguments
+    args = parser.parse_args()
+
+    return args
+
+
 if __name__ == "__main__":
     sys.exit(main())
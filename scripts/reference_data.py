@@ -0,0 +1,325 @@
+#! /usr/bin/env python3
+# encoding: utf-8
+'''
+ -- Keeps the reference data on cruises, stations and gears in the database
+
+
+@deffield    updated: Updated
+'''
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-17'
+__updated__ = '2026-10-17'
+
+import psycopg2
+import psycopg2.extras
+from psycopg2 import sql
+import getpass
+import os
+import re
+import sys
+import pandas as pd
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import bulk_copy as bc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# The reference data, the csv file relative to this directory, the table,
+# the key column and the types of the columns that are not text.
+# Column names are lower case with _ for anything else than letters and
+# digits, both in the tables and in the lookups.
+SOURCES = {
+    "cruises": {"file": "cruises.csv",
+                "table": "ref_cruises",
+                "key": "cruisenumber",
+                "types": {"cruisenumber": "integer"}},
+    "stations": {"file": "stations.csv",
+                 "table": "ref_stations",
+                 "key": "stationname",
+                 "types": {"eventid": "uuid",
+                           "decimallatitude": "double precision",
+                           "decimallongitude": "double precision"}},
+    "gears": {"file": os.path.join("darwinsheet", "config", "list_gear_types.csv"),
+              "table": "ref_gears",
+              "key": "gear_type",
+              "types": {}},
+}
+
+# Loaded reference data, by name
+_cache = {}
+
+
+def column_name(name):
+    return re.sub(r'[^a-z0-9]+', '_', name.strip().lower()).strip('_')
+
+
+def clean(value):
+    '''
+    Strips the quotes around names in cruises.csv, some closing with a
+    typographic quote
+    '''
+    if isinstance(value, str):
+        return value.strip().strip("'’").strip()
+    return value
+
+
+def read_source(name):
+    '''
+    Reads the csv file of the reference data
+
+    Parameters
+    ----------
+    name: str
+        Key in SOURCES
+
+    Returns
+    ----------
+    frame: pandas.DataFrame
+        With renamed columns, cleaned values and one row per key
+    '''
+    source = SOURCES[name]
+    frame = pd.read_csv(os.path.join(HERE, source['file']), dtype=str)
+    frame.columns = [column_name(c) for c in frame.columns]
+    for col in frame.columns:
+        frame[col] = frame[col].map(clean)
+    key = source['key']
+    frame = frame[frame[key].notna() & (frame[key] != '')]
+    frame = frame.drop_duplicates(subset=[key], keep='last')
+    for col, kind in source['types'].items():
+        if col not in frame.columns:
+            continue
+        if kind == 'integer':
+            frame[col] = frame[col].astype(float).astype(int)
+        elif kind == 'double precision':
+            frame[col] = pd.to_numeric(frame[col])
+    return frame.reset_index(drop=True)
+
+
+def create_table(cur, name, columns):
+    '''
+    Creates the table of the reference data and adds missing columns
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    name: str
+        Key in SOURCES
+
+    columns: list of str
+        The columns of the csv file
+    '''
+    source = SOURCES[name]
+    table = sql.Identifier(source['table'])
+    key = source['key']
+    cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} ({} {} PRIMARY KEY)").format(
+        table, sql.Identifier(key), sql.SQL(source['types'].get(key, 'text'))))
+    for col in columns:
+        cur.execute(sql.SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS {} {}").format(
+            table, sql.Identifier(col), sql.SQL(source['types'].get(col, 'text'))))
+
+
+def sync(cur, name):
+    '''
+    Brings the table in line with the csv file. The file is copied into a
+    staging table, new and changed rows are upserted in one statement and
+    rows no longer in the file are deleted. Unchanged rows are not written.
+
+    Parameters
+    ----------
+    cur: psycopg2 cursor
+
+    name: str
+        Key in SOURCES
+
+    Returns
+    ----------
+    counts: dict
+        Rows inserted, updated and deleted
+    '''
+    source = SOURCES[name]
+    frame = read_source(name)
+    columns = list(frame.columns)
+    create_table(cur, name, columns)
+    staging = source['table'] + '_staging'
+    bc.create_staging(cur, staging, like=source['table'])
+    bc.copy_rows(cur, staging, columns, frame.astype(object).where(frame.notna(), None).values.tolist())
+
+    table = sql.Identifier(source['table'])
+    key = sql.Identifier(source['key'])
+    idents = [sql.Identifier(c) for c in columns]
+    cur.execute(sql.SQL('''
+    INSERT INTO {table} AS t ({cols}) SELECT {cols} FROM {staging}
+    ON CONFLICT ({key}) DO UPDATE SET ({cols}) = ROW({excluded})
+    WHERE ({current}) IS DISTINCT FROM ({excluded})
+    RETURNING xmax = 0''').format(
+        table=table, key=key, staging=sql.Identifier(staging),
+        cols=sql.SQL(', ').join(idents),
+        excluded=sql.SQL(', ').join([sql.SQL("EXCLUDED.{}").format(i) for i in idents]),
+        current=sql.SQL(', ').join([sql.SQL("t.{}").format(i) for i in idents])))
+    written = [r[0] for r in cur.fetchall()]
+    cur.execute(sql.SQL('''
+    DELETE FROM {table} t
+    WHERE NOT EXISTS (SELECT 1 FROM {staging} s WHERE s.{key} = t.{key})''').format(
+        table=table, key=key, staging=sql.Identifier(staging)))
+    _cache.pop(name, None)
+    return {'inserted': sum(written),
+            'updated': len(written) - sum(written),
+            'deleted': cur.rowcount}
+
+
+def load(name, cur=None):
+    '''
+    The reference data as a dictionary on the key, read once and cached.
+    Read from the table if a cursor is given and the table has been synced,
+    otherwise from the csv file.
+
+    Parameters
+    ----------
+    name: str
+        Key in SOURCES
+
+    cur: psycopg2 cursor, optional
+        Default: None
+
+    Returns
+    ----------
+    rows: dict
+        The rows as dictionaries of the columns, on the key
+    '''
+    if name not in _cache:
+        source = SOURCES[name]
+        if cur is not None:
+            cur.execute("SELECT to_regclass(%s)", (source['table'],))
+            if cur.fetchone()[0] is None:
+                cur = None
+        if cur is not None:
+            cur.execute(sql.SQL("SELECT * FROM {} ORDER BY {}").format(
+                sql.Identifier(source['table']), sql.Identifier(source['key'])))
+            columns = [d[0] for d in cur.description]
+            rows = [dict(zip(columns, r)) for r in cur.fetchall()]
+        else:
+            frame = read_source(name)
+            rows = frame.astype(object).where(frame.notna(), None).to_dict('records')
+        _cache[name] = {key_value(name, r[source['key']]): r for r in rows}
+    return _cache[name]
+
+
+def frame(name, cur=None):
+    '''
+    The reference data as a DataFrame with one row per key, see load
+
+    Parameters
+    ----------
+    name: str
+        Key in SOURCES
+
+    cur: psycopg2 cursor, optional
+        Default: None
+
+    Returns
+    ----------
+    frame: pandas.DataFrame
+    '''
+    return pd.DataFrame(list(load(name, cur).values()))
+
+
+def key_value(name, key):
+    '''
+    The key as it is stored, cruise numbers can come as floats or strings
+    '''
+    if SOURCES[name]['types'].get(SOURCES[name]['key']) == 'integer':
+        try:
+            return int(float(key))
+        except (TypeError, ValueError, OverflowError):
+            return None
+    return None if key is None else str(key)
+
+
+def lookup(name, key, field=None, cur=None):
+    '''
+    Looks up one row of the reference data
+
+    Parameters
+    ----------
+    name: str
+        Key in SOURCES
+
+    key: object
+        The cruise number, station name or gear type
+
+    field: str, optional
+        Only return this column
+        Default: None
+
+    cur: psycopg2 cursor, optional
+        Read from the table the first time instead of the csv file
+        Default: None
+
+    Returns
+    ----------
+    row: dict or value
+        The row, or the value of field, None if not found
+    '''
+    row = load(name, cur).get(key_value(name, key))
+    if row is None or field is None:
+        return row
+    return row.get(field)
+
+
+def main():
+    '''Command line options.'''
+    args = parse_options()
+    # Connect to the database as the user running the script
+    conn = psycopg2.connect('dbname=aen_db user=' + getpass.getuser())
+    cur = conn.cursor()
+    for name in args.names or list(SOURCES):
+        print(name, sync(cur, name))
+    conn.commit()
+    cur.close()
+    conn.close()
+    return 0
+
+
+def parse_options():
+    """
+    Parse the command line options and return these.
+    """
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (
+        program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+    Created on %s.
+
+    Distributed on an "AS IS" basis without warranties
+    or conditions of any kind, either express or implied.
+
+    USAGE
+''' % (program_shortdesc, str(__date__))
+
+    # Setup argument parser
+    parser = ArgumentParser(description=program_license,
+                            formatter_class=RawDescriptionHelpFormatter)
+
+    parser.add_argument('names', nargs='*', default=None,
+                        help="The reference data to sync from the csv files, one of " +
+                        ", ".join(SOURCES) + " [default: all]")
+    parser.add_argument('-V', '--version', action='version',
+                        version=program_version_message)
+
+    # Process arguments
+    args = parser.parse_args()
+    # Checked here, argparse checks the whole default list against choices
+    unknown = [name for name in args.names if name not in SOURCES]
+    if unknown:
+        parser.error("unknown reference data " + ", ".join(unknown))
+
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,8 +19,9 @@ import getpass
 import os
 from datetime import date
 import sys
+import reference_data as rd
 
-def stationsCSV(definedStationsFilepath, data):
+def stationsCSV(definedStations, data):
     '''
     Load dataframe of all stations with their coordinates
     In this case, this should be the intended coordinate if available, not the coordinate visisted
@@ -28,8 +29,8 @@ def stationsCSV(definedStationsFilepath, data):
     
     Parameters
     ----------
-    definedStationsFilepath : string
-        Filepath for csv file that contains the names and locations of officially defined stations for the project
+    definedStations : pandas.dataframe
+        Names and locations of officially defined stations for the project, as given by reference_data.frame
     data: pandas.dataframe
         Dataframe of all samples in database
     
@@ -38,9 +39,10 @@ def stationsCSV(definedStationsFilepath, data):
     stations : pandas.dataframe
         Dataframe of all stations and their defined or average coordinates
     '''
-    stations = pd.read_csv(definedStationsFilepath) # Defined stations
-    
-    del stations['eventID'], stations['sampleType'] # Removing columns not needed
+    # Defined stations, only the columns needed
+    stations = definedStations[['stationname', 'decimallongitude', 'decimallatitude']].rename(
+        columns={'stationname': 'stationName', 'decimallongitude': 'decimalLongitude',
+                 'decimallatitude': 'decimalLatitude'})
     
     otherStations = set(data['stationname'])  
     
@@ -324,7 +326,7 @@ def main():
     except: 
         pass
         
-    stations = stationsCSV('stations.csv', data)
+    stations = stationsCSV(rd.frame('stations', conn.cursor()), data)
     
     closeStations(stations,folder+'/closeStations.csv')
     
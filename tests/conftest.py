@@ -0,0 +1,27 @@
+'''
+Shared fixtures, the database tests run against AEN_TEST_DSN and are
+skipped without it
+'''
+
+import os
+import sys
+import psycopg2
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+
+@pytest.fixture
+def cur():
+    '''
+    Cursor in a transaction that is rolled back after the test
+    '''
+    dsn = os.environ.get('AEN_TEST_DSN')
+    if not dsn:
+        pytest.skip('AEN_TEST_DSN is not set')
+    conn = psycopg2.connect(dsn)
+    try:
+        yield conn.cursor()
+    finally:
+        conn.rollback()
+        conn.close()
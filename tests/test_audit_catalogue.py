@@ -0,0 +1,51 @@
+'''
+Tests of the hierarchy audit in audit_catalogue
+'''
+
+import datetime as dt
+import uuid
+import pytest
+import audit_catalogue
+
+A, B, C, D, E = [str(uuid.uuid4()) for i in range(5)]
+
+
+@pytest.fixture
+def catalogue(cur):
+    '''
+    A temporary aen with the columns the audit reads
+    '''
+    cur.execute('''CREATE TEMPORARY TABLE aen (
+        eventid uuid PRIMARY KEY, parenteventid uuid, cruisenumber integer,
+        sampletype text, source text, decimallatitude double precision,
+        decimallongitude double precision, eventdate date)''')
+
+    def insert(rows):
+        for eventid, parent, lat, lon in rows:
+            cur.execute('''INSERT INTO aen VALUES (%s, %s, 2018707, 'Niskin', 'test',
+                                                  %s, %s, %s)''',
+                        (eventid, parent, lat, lon, dt.date(2018, 8, 10)))
+    return insert
+
+
+def test_top_level_row_has_no_problems(cur, catalogue):
+    catalogue([(A, None, 78.5, 30.0)])
+    assert audit_catalogue.audit(cur).empty
+
+
+def test_missing_positions_are_not_far_away(cur, catalogue):
+    catalogue([(A, None, 78.5, 30.0), (B, A, None, None), (C, A, 78.5, 30.01)])
+    assert audit_catalogue.audit(cur).empty
+
+
+def test_orphans_are_only_orphans(cur, catalogue):
+    catalogue([(D, E, 78.5, 30.0), (C, E, 78.5, 30.0)])
+    problems = audit_catalogue.audit(cur)
+    assert problems['problem'].tolist() == ['orphan']
+
+
+def test_far_child(cur, catalogue):
+    catalogue([(A, None, 78.5, 30.0), (B, A, 80.0, 30.0)])
+    problems = audit_catalogue.audit(cur)
+    assert problems['problem'].tolist() == ['position']
+    assert problems['eventid'].tolist() == [B]
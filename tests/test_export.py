@@ -0,0 +1,68 @@
+'''
+Tests of the Drupal escaping in export_CSV
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+import export_CSV
+from benchmark_export import legacy_escape
+
+# Values without dollar signs, where the legacy escaping is right
+VALUES = ["it's", 'say "hi"', 'a, b', 'line 1\nline "2"', '"a"=>"1, 2"',
+          "''", '""', 'Plain remark', '', None, np.nan]
+
+
+def catalogue(values, dtype):
+    return pd.DataFrame({'eventremarks': pd.Series(values, dtype=dtype),
+                         'metadata': pd.Series(values, dtype=dtype),
+                         'other': pd.Series(values, dtype=dtype),
+                         'history': pd.Series(values, dtype=dtype),
+                         'decimallatitude': np.linspace(76, 82, len(values))})
+
+
+@pytest.mark.parametrize('dtype', [object, 'str'])
+def test_matches_legacy(dtype):
+    df = catalogue(VALUES, dtype)
+    expected = df.copy()
+    legacy_escape(expected)
+    export_CSV.escape_for_drupal(df)
+    pd.testing.assert_frame_equal(df.astype(object), expected.astype(object))
+
+
+@pytest.mark.parametrize('dtype', [object, 'str'])
+@pytest.mark.parametrize('value, plain, wrapped', [
+    ('cost $5', 'cost 5', '$cost 5$'),
+    ('$$', '', '$$'),
+    ("\"b\"=>\"it's $3, 4\"", '*b*=>*its 3, 4*', '$*b*=>*its 3, 4*$'),
+])
+def test_dollar_signs_removed(dtype, value, plain, wrapped):
+    df = catalogue([value], dtype)
+    export_CSV.escape_for_drupal(df)
+    assert df['eventremarks'].iloc[0] == plain
+    assert df['other'].iloc[0] == wrapped
+
+
+def test_missing_values_stay_missing():
+    df = catalogue([None, np.nan], object)
+    export_CSV.escape_for_drupal(df)
+    assert df['eventremarks'].isna().all()
+    assert df['other'].isna().all()
+
+
+def test_numbers_left_alone():
+    df = pd.DataFrame({'bottlenumber': pd.Series([3, "it's 4", None], dtype=object),
+                       'decimallatitude': [76.5, 77.0, np.nan]})
+    export_CSV.escape_for_drupal(df)
+    assert df['bottlenumber'].tolist()[:2] == [3, 'its 4']
+    assert df['decimallatitude'].iloc[0] == 76.5
+
+
+def test_written_csv_matches_legacy(tmp_path):
+    df = catalogue(VALUES, object)
+    expected = df.copy()
+    legacy_escape(expected)
+    export_CSV.escape_for_drupal(df)
+    df.to_csv(tmp_path / 'new.csv', sep='|', index=False)
+    expected.to_csv(tmp_path / 'legacy.csv', sep='|', index=False)
+    assert (tmp_path / 'new.csv').read_text() == (tmp_path / 'legacy.csv').read_text()
@@ -0,0 +1,45 @@
+'''
+Tests of the command line and lookups of reference_data
+'''
+
+import sys
+import pytest
+import reference_data as rd
+
+
+@pytest.fixture
+def argv(monkeypatch):
+    '''
+    Sets the command line, parse_options reads the description from __main__
+    '''
+    monkeypatch.setitem(sys.modules, '__main__', rd)
+
+    def set_argv(*args):
+        monkeypatch.setattr(sys, 'argv', ['reference_data.py'] + list(args))
+    return set_argv
+
+
+def test_no_names_syncs_all(argv):
+    argv()
+    assert rd.parse_options().names == []
+
+
+def test_names(argv):
+    argv('cruises', 'gears')
+    assert rd.parse_options().names == ['cruises', 'gears']
+
+
+def test_unknown_name(argv):
+    argv('cruises', 'ships')
+    with pytest.raises(SystemExit):
+        rd.parse_options()
+
+
+@pytest.mark.parametrize('key', [2018707, 2018707.0, '2018707', ' 2018707.0'])
+def test_cruise_key(key):
+    assert rd.key_value('cruises', key) == 2018707
+
+
+@pytest.mark.parametrize('key', [None, float('nan'), float('inf'), 'x'])
+def test_bad_cruise_key(key):
+    assert rd.key_value('cruises', key) is None